@@ -1,29 +1,667 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import collections
+import concurrent.futures
+import heapq
+import itertools
 import logging
+import os
+import struct
 import time
 import threading
+import numpy as np
 import trollius as asyncio
+from trollius import From, Return
 import dynamixel_functions as dxl
+from CraneX7Kinematics import CraneX7Kinematics, CircularPath, \
+    LinearPath, TrapezoidProfile, WorkspaceIndex
 
 __author__ = "Saburo Takahashi"
 __copyright__ = "Copyright 2017, Saburo Takahashi"
 __license__ = "MIT License"
 
 
+# position resolution: 4096 ticks per turn, 0 degree at 2048 ticks
+POS_RESOLUTION = 4096
+POS_CENTER = 2048
+DEG_PER_TICK = 360.0 / POS_RESOLUTION
+RAD_PER_TICK = 2.0 * np.pi / POS_RESOLUTION
+# velocity unit (0.229 rpm) in rad/s
+RAD_PER_SEC_PER_VEL = 0.229 * 2.0 * np.pi / 60.0
+
+
+# Unit conversion of arrays (or scalars) of positions; angles are float
+# and ticks are rounded to the nearest tick
+def ticks2deg(ticks):
+    return (np.asarray(ticks, dtype=np.float64) - POS_CENTER) * DEG_PER_TICK
+
+
+def ticks2rad(ticks):
+    return (np.asarray(ticks, dtype=np.float64) - POS_CENTER) * RAD_PER_TICK
+
+
+def deg2ticks(deg):
+    return np.rint(np.asarray(deg, dtype=np.float64) / DEG_PER_TICK +
+                   POS_CENTER).astype(np.int64)
+
+
+def rad2ticks(rad):
+    return np.rint(np.asarray(rad, dtype=np.float64) / RAD_PER_TICK +
+                   POS_CENTER).astype(np.int64)
+
+
+def signed16(value):
+    # two's complement of a 2 byte value (read as unsigned)
+    return value - 0x10000 if value >= 0x8000 else value
+
+
+def sync_profile(travel, acc, vel, vlimit):
+    # Profile accelerations and velocities scaled by the travel [ticks] of
+    # each joint. A velocity-based profile takes 64 * PV / PA [ms] to
+    # accelerate and 64 * travel / PV [ms] in total, so scaling both PV
+    # and PA by the travel ratio to the slowest joint gives every joint
+    # the same timing. 0 disables a profile: an unlimited velocity runs
+    # at the velocity limit, an unlimited acceleration of the slowest
+    # joint stays unlimited for all; other results are at least 1.
+    travel = np.abs(np.asarray(travel, dtype=np.float64))
+    acc = np.asarray(acc, dtype=np.float64)
+    vel = np.asarray(vel, dtype=np.float64)
+    vel = np.where(vel > 0, vel, np.asarray(vlimit, dtype=np.float64))
+    lead = int(np.argmax(travel / vel))
+    if travel[lead] == 0:
+        return acc.astype(int).tolist(), vel.astype(int).tolist()
+    scale = travel / travel[lead]
+    if acc[lead] > 0:
+        acc = np.maximum(np.rint(acc[lead] * scale), 1)
+    else:
+        acc = np.zeros_like(scale)
+    vel = np.maximum(np.rint(vel[lead] * scale), 1)
+    return acc.astype(int).tolist(), vel.astype(int).tolist()
+
+
 class ControlTable():
     def __init__(self, address, byte):
         self.address = address
         self.byte = byte
 
 
+class SyncReader(object):
+    # Read the same control table block from several servos with a single
+    # Protocol 2.0 Sync Read instruction
+    COMM_SUCCESS = 0
+
+    def __init__(self, port, protocol, address, length, ids):
+        self.port = port
+        self.protocol = protocol
+        self.address = address
+        self.length = length
+        self.ids = list(ids)
+        self._group = dxl.groupSyncRead(port, protocol, address, length)
+        for mid in self.ids:
+            if not dxl.groupSyncReadAddParam(self._group, mid):
+                logging.error("sync read: cannot add id " + str(mid))
+
+    def read(self):
+        # Send one sync read instruction and receive all status packets
+        dxl.groupSyncReadTxRxPacket(self._group)
+        result = dxl.getLastTxRxResult(self.port, self.protocol)
+        if result != self.COMM_SUCCESS:
+            logging.error(dxl.getTxRxResult(self.protocol, result))
+            return False
+        return True
+
+    def get(self, mid, control_table, default=None):
+        # Decode one field of the last received block
+        if not dxl.groupSyncReadIsAvailable(self._group, mid,
+                                            control_table.address,
+                                            control_table.byte):
+            return default
+        return dxl.groupSyncReadGetData(self._group, mid,
+                                        control_table.address,
+                                        control_table.byte)
+
+
+class SyncWriter(object):
+    # Write contiguous control table fields of several servos with a single
+    # Protocol 2.0 Sync Write instruction (no status packets are returned)
+    COMM_SUCCESS = 0
+
+    def __init__(self, port, protocol, control_tables, trace=None):
+        self.port = port
+        self.protocol = protocol
+        self.trace = trace
+        self.control_tables = list(control_tables)
+        self.address = self.control_tables[0].address
+        self.length = 0
+        # position of each field in the data of a servo
+        self._fields = list()
+        for t in self.control_tables:
+            if t.address != self.address + self.length:
+                raise ValueError("sync write: fields are not contiguous")
+            self._fields.append((t.byte, self.length))
+            self.length += t.byte
+        self._group = dxl.groupSyncWrite(port, protocol,
+                                         self.address, self.length)
+        # ids of the allocated parameters
+        self._ids = list()
+
+    def write(self, params):
+        # params: list of (id, [value of each control table]); parameters
+        # are allocated once per id set and then overwritten in place
+        if not self._same_ids(params):
+            if not self._allocate(params):
+                return False
+        else:
+            for mid, values in params:
+                for (byte, pos), val in zip(self._fields, values):
+                    dxl.groupSyncWriteChangeParam(self._group, mid, val,
+                                                  byte, pos)
+        if self.trace:
+            start = self.trace.clock()
+        dxl.groupSyncWriteTxPacket(self._group)
+        result = dxl.getLastTxRxResult(self.port, self.protocol)
+        if self.trace:
+            self.trace.record(start, TraceRecorder.BUS_WRITE, len(params),
+                              self.address, self.trace.clock() - start,
+                              result)
+        if result != self.COMM_SUCCESS:
+            logging.error(dxl.getTxRxResult(self.protocol, result))
+            return False
+        return True
+
+    def _same_ids(self, params):
+        if len(params) != len(self._ids):
+            return False
+        for mid, (pid, values) in zip(self._ids, params):
+            if mid != pid:
+                return False
+        return True
+
+    def _allocate(self, params):
+        dxl.groupSyncWriteClearParam(self._group)
+        self._ids = list()
+        for mid, values in params:
+            for t, val in zip(self.control_tables, values):
+                if not dxl.groupSyncWriteAddParam(self._group, mid,
+                                                  val, t.byte):
+                    logging.error("sync write: cannot add id " + str(mid))
+                    dxl.groupSyncWriteClearParam(self._group)
+                    return False
+            self._ids.append(mid)
+        return True
+
+
+class BusQueue(object):
+    # Work items of the bus thread ordered by priority, then by submission.
+    # Pushing from other threads needs no lock: heappush on tuples with a
+    # unique sequence number runs under the GIL without calling back into
+    # Python code
+    COMMAND = 0
+    STATUS = 1
+
+    def __init__(self):
+        self._heap = list()
+        self._seq = itertools.count()
+
+    def push(self, priority, submitted, work, args=()):
+        heapq.heappush(self._heap,
+                       (priority, next(self._seq), submitted, work, args))
+
+    def pop(self):
+        # (priority, submitted, work, args) of the most urgent item or None
+        try:
+            priority, seq, submitted, work, args = heapq.heappop(self._heap)
+        except IndexError:
+            return None
+        return priority, submitted, work, args
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class StateStream(object):
+    # Status snapshots for a coroutine consumer on the bus loop; when the
+    # consumer falls behind, the oldest snapshots are dropped
+    def __init__(self, streams, maxsize):
+        self._streams = streams
+        self._queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        streams.append(self)
+
+    def put(self, state):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(state)
+
+    def get(self):
+        # coroutine: next snapshot
+        return self._queue.get()
+
+    def close(self):
+        if self in self._streams:
+            self._streams.remove(self)
+
+
+class BusProfile(object):
+    # Bus tuning applied to every servo on port open
+    #  return_delay_time:   Return Delay Time (unit=2[usec], None: keep)
+    #  status_return_level: 2: status for all instructions,
+    #                       1: status for read/ping only (goal writes are
+    #                          sent without waiting for a status packet),
+    #                       None: keep
+    def __init__(self, return_delay_time=None, status_return_level=None):
+        self.return_delay_time = return_delay_time
+        self.status_return_level = status_return_level
+
+
+class LatencyStats(object):
+    # Running statistics of a latency [s]
+    def __init__(self):
+        self.count = 0
+        self.last = 0.0
+        self.max = 0.0
+        self.total = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.last = value
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class CraneX7State(object):
+    # Immutable snapshot of one status cycle.
+    #  seq:        sequence number of the status cycle
+    #  stamp:      monotonic time [s] the status was sampled
+    #  cycle_time: time [s] spent on the bus in the status cycle
+    # Joint values are tuples in the order of joints J0..J6.
+    __slots__ = ("seq", "stamp", "cycle_time",
+                 "pos", "pos_hand", "vel", "cur",
+                 "moving", "err",
+                 "tmp", "prof_vel", "torque_enable")
+
+    def __init__(self, seq, stamp, cycle_time, pos, pos_hand, vel, cur,
+                 moving, err, tmp, prof_vel, torque_enable):
+        for name, value in zip(self.__slots__,
+                               (seq, stamp, cycle_time, pos, pos_hand,
+                                vel, cur, moving, err,
+                                tmp, prof_vel, torque_enable)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CraneX7State is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CraneX7State is immutable")
+
+
+class TelemetryWindow(object):
+    # Read-only views of the samples in a time window of TelemetryHistory.
+    # The views share memory with the ring buffer, so copy them when they
+    # are kept longer than the history capacity.
+    def __init__(self, stamp, pos, vel, cur, tmp):
+        self.stamp = stamp
+        self.pos = pos
+        self.vel = vel
+        self.cur = cur
+        self.tmp = tmp
+
+    def __len__(self):
+        return len(self.stamp)
+
+
+class TelemetryHistory(object):
+    # Fixed capacity ring buffer of status samples (preallocated).
+    # Every sample is written twice (at i and i + capacity), so that the
+    # latest samples are always one contiguous zero-copy view.
+    FIELDS = ("pos", "vel", "cur", "tmp")
+
+    def __init__(self, capacity, joints=7):
+        self.capacity = capacity
+        self._stamp = np.zeros(2 * capacity)
+        self._data = dict((name, np.zeros((2 * capacity, joints)))
+                          for name in self.FIELDS)
+        self._head = 0
+        self._count = 0
+
+    def append(self, state):
+        i = self._head
+        k = i + self.capacity
+        self._stamp[i] = self._stamp[k] = state.stamp
+        for name in self.FIELDS:
+            data = self._data[name]
+            data[i] = data[k] = getattr(state, name)
+        self._head = (i + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def _slice(self, seconds=None):
+        end = self._head + self.capacity
+        start = end - self._count
+        if seconds is not None and self._count:
+            stamp = self._stamp[start:end]
+            start += int(np.searchsorted(stamp, stamp[-1] - seconds))
+        return slice(start, end)
+
+    def _view(self, array, index):
+        view = array[index]
+        view.flags.writeable = False
+        return view
+
+    def window(self, seconds=None):
+        # samples of the last seconds (all samples if None)
+        index = self._slice(seconds)
+        return TelemetryWindow(self._view(self._stamp, index),
+                               *[self._view(self._data[name], index)
+                                 for name in self.FIELDS])
+
+    def _window_data(self, seconds, field):
+        data = self._data[field][self._slice(seconds)]
+        if not len(data):
+            return None
+        return data
+
+    def mean(self, seconds=None, field="cur"):
+        # per-joint mean over the window
+        data = self._window_data(seconds, field)
+        return data.mean(axis=0) if data is not None else None
+
+    def max(self, seconds=None, field="cur"):
+        # per-joint max of absolute value over the window
+        data = self._window_data(seconds, field)
+        return np.abs(data).max(axis=0) if data is not None else None
+
+    def rms(self, seconds=None, field="cur"):
+        # per-joint root mean square over the window
+        data = self._window_data(seconds, field)
+        if data is None:
+            return None
+        return np.sqrt(np.einsum("ij,ij->j", data, data) / len(data))
+
+    def __len__(self):
+        return self._count
+
+
+class TraceRecorder(object):
+    # Ring buffer of fixed-size binary events.
+    # record: stamp [s] (double), event (uint8), id (uint8), code (uint16),
+    #         duration [s] (float), value (int32)
+    # code of COMMAND events is an index into names (command names)
+    RECORD = struct.Struct("<dBBHfi")
+    MAGIC = b"CX7T"
+    HEADER = struct.Struct("<4sHHII")
+    VERSION = 1
+
+    # events
+    #  COMMAND:   id: 0, duration: run time, value: latency [us]
+    #  BUS_WRITE: id: servos, code: address, duration: write time,
+    #             value: result
+    #  BUS_READ:  id: due groups, duration: read time, value: result
+    #  CYCLE:     duration: jitter, value: status seq
+    #  OVERRUN:   duration: late, value: missed deadlines
+    #  ERROR:     id: servo id, code: hardware error, value: result
+    COMMAND = 1
+    BUS_WRITE = 2
+    BUS_READ = 3
+    CYCLE = 4
+    OVERRUN = 5
+    ERROR = 6
+
+    def __init__(self, capacity=4096, clock=time.time):
+        self.capacity = capacity
+        self.clock = clock
+        self._buf = bytearray(capacity * self.RECORD.size)
+        self._count = 0
+        self.names = list()
+        self._codes = dict()
+
+    def code(self, name):
+        # index of a command name (interned on first use)
+        c = self._codes.get(name)
+        if c is None:
+            c = self._codes[name] = len(self.names)
+            self.names.append(name)
+        return c
+
+    def record(self, stamp, event, mid=0, code=0, duration=0.0, value=0):
+        self.RECORD.pack_into(
+            self._buf, (self._count % self.capacity) * self.RECORD.size,
+            stamp, event, mid, code, duration, value)
+        self._count += 1
+
+    def _ordered(self):
+        # records from the oldest to the latest
+        size = self.RECORD.size
+        if self._count <= self.capacity:
+            return bytes(self._buf[:self._count * size])
+        head = (self._count % self.capacity) * size
+        return bytes(self._buf[head:] + self._buf[:head])
+
+    def events(self):
+        # decoded records from the oldest to the latest
+        data = self._ordered()
+        return [self.RECORD.unpack_from(data, i)
+                for i in range(0, len(data), self.RECORD.size)]
+
+    def dump(self, path):
+        # header, command names (one per line) and the records
+        data = self._ordered()
+        names = "\n".join(self.names).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION,
+                                     self.RECORD.size, len(names),
+                                     len(data) // self.RECORD.size))
+            f.write(names)
+            f.write(data)
+        return True
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+
+class Histogram(object):
+    # Fixed bin histogram; values beyond the last bin are counted there
+    def __init__(self, width, bins):
+        self.width = width
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def add(self, value):
+        i = int(value / self.width)
+        if i < 0:
+            i = 0
+        elif i >= len(self.counts):
+            i = len(self.counts) - 1
+        self.counts[i] += 1
+
+    @property
+    def edges(self):
+        # lower edge [s] of each bin
+        return np.arange(len(self.counts)) * self.width
+
+
+class LoopStats(object):
+    # Timing statistics of a fixed-rate loop
+    #  period:  interval between successive cycle starts
+    #  jitter:  delay of a cycle start from its deadline
+    #  overrun: time a cycle ran past the deadline of the next cycle
+    def __init__(self, period, width=0.0005, bins=80):
+        self.period = period
+        self.period_hist = Histogram(width, bins)
+        self.jitter_hist = Histogram(width, bins)
+        self.overrun_hist = Histogram(width, bins)
+        self.cycles = 0
+        self.overruns = 0
+        self.missed = 0
+        self.max_jitter = 0.0
+        self._last_start = None
+
+    def start(self, now, deadline):
+        jitter = now - deadline
+        self.jitter_hist.add(jitter)
+        if jitter > self.max_jitter:
+            self.max_jitter = jitter
+        if self._last_start is not None:
+            self.period_hist.add(now - self._last_start)
+        self._last_start = now
+        self.cycles += 1
+
+    def overrun(self, late, missed):
+        # late: time past the next deadline, missed: skipped deadlines
+        self.overruns += 1
+        self.missed += missed
+        self.overrun_hist.add(late)
+
+
+class JointTrajectory(object):
+    # Interpolation of timed joint waypoints. The velocities at the
+    # waypoints are those of the C2 cubic spline with zero end velocities;
+    # quintic segments also match its accelerations (zero at both ends)
+    METHODS = ("cubic", "quintic")
+
+    def __init__(self, times, points, method="cubic"):
+        if method not in self.METHODS:
+            raise ValueError("trajectory: unknown method " + str(method))
+        t = np.asarray(times, dtype=np.float64)
+        q = np.asarray(points, dtype=np.float64)
+        if t.ndim != 1 or len(t) < 2 or q.ndim != 2 or len(q) != len(t):
+            raise ValueError("trajectory: need two or more waypoints")
+        if np.any(np.diff(t) <= 0):
+            raise ValueError("trajectory: times must increase")
+        self.method = method
+        self.times = t
+        self.points = q
+        self._vel = self._knot_velocities(t, q)
+        self._acc = self._knot_accelerations(t, q, self._vel)
+        if method == "quintic":
+            self._acc[0] = 0.0
+            self._acc[-1] = 0.0
+
+    @property
+    def duration(self):
+        return self.times[-1] - self.times[0]
+
+    @staticmethod
+    def _knot_velocities(t, q):
+        # h[i] v[i-1] + 2 (h[i-1] + h[i]) v[i] + h[i-1] v[i+1]
+        #   = 3 (h[i] d[i-1] + h[i-1] d[i]),  v[0] = v[n-1] = 0
+        n = len(t)
+        h = np.diff(t)
+        d = np.diff(q, axis=0) / h[:, None]
+        a = np.zeros((n, n))
+        b = np.zeros_like(q)
+        a[0, 0] = a[-1, -1] = 1.0
+        for i in range(1, n - 1):
+            a[i, i - 1] = h[i]
+            a[i, i] = 2.0 * (h[i - 1] + h[i])
+            a[i, i + 1] = h[i - 1]
+            b[i] = 3.0 * (h[i] * d[i - 1] + h[i - 1] * d[i])
+        return np.linalg.solve(a, b)
+
+    @staticmethod
+    def _knot_accelerations(t, q, v):
+        # second derivative of the cubic segments at the waypoints
+        h = np.diff(t)[:, None]
+        d = np.diff(q, axis=0) / h
+        acc = np.empty_like(q)
+        acc[:-1] = (6.0 * d - 4.0 * v[:-1] - 2.0 * v[1:]) / h
+        acc[-1] = (-6.0 * d[-1] + 2.0 * v[-2] + 4.0 * v[-1]) / h[-1]
+        return acc
+
+    def sample(self, s):
+        # joint positions at times s (array), clamped to the waypoints
+        t = self.times
+        s = np.clip(np.asarray(s, dtype=np.float64), t[0], t[-1])
+        i = np.clip(np.searchsorted(t, s, side="right") - 1, 0, len(t) - 2)
+        h = (t[i + 1] - t[i])[:, None]
+        u = ((s - t[i]) / h[:, 0])[:, None]
+        q0, q1 = self.points[i], self.points[i + 1]
+        v0, v1 = self._vel[i] * h, self._vel[i + 1] * h
+        u2 = u * u
+        u3 = u2 * u
+        if self.method == "cubic":
+            return ((2.0 * u3 - 3.0 * u2 + 1.0) * q0 +
+                    (u3 - 2.0 * u2 + u) * v0 +
+                    (-2.0 * u3 + 3.0 * u2) * q1 +
+                    (u3 - u2) * v1)
+        a0, a1 = self._acc[i] * h * h, self._acc[i + 1] * h * h
+        u4 = u3 * u
+        u5 = u4 * u
+        return ((1.0 - 10.0 * u3 + 15.0 * u4 - 6.0 * u5) * q0 +
+                (u - 6.0 * u3 + 8.0 * u4 - 3.0 * u5) * v0 +
+                0.5 * (u2 - 3.0 * u3 + 3.0 * u4 - u5) * a0 +
+                0.5 * (u3 - 2.0 * u4 + u5) * a1 +
+                (-4.0 * u3 + 7.0 * u4 - 3.0 * u5) * v1 +
+                (10.0 * u3 - 15.0 * u4 + 6.0 * u5) * q1)
+
+
+class StatusGroup(object):
+    # Control table fields polled together at the same rate [Hz]
+    def __init__(self, name, control_tables, rate):
+        self.name = name
+        self.control_tables = tuple(control_tables)
+        self.rate = rate
+        self.period = 1
+        self.phase = 0
+
+
+class StatusScheduler(object):
+    # Decide which status groups are due on each control tick.
+    # Slow groups get different phases so that their reads are spread
+    # across ticks and the bus time per tick stays flat.
+    def __init__(self, control_rate, groups):
+        self.control_rate = control_rate
+        self.groups = list(groups)
+        self._tick = 0
+        placed = list()
+        for g in self.groups:
+            g.period = max(1, int(round(control_rate / float(g.rate))))
+            g.phase = 0
+            if g.period > 1:
+                g.phase = min(range(g.period),
+                              key=lambda p: self._collisions(g, p, placed))
+                placed.append(g)
+
+    def _collisions(self, group, phase, placed):
+        # two groups meet on some tick iff their phases are congruent
+        # modulo the gcd of their periods
+        count = 0
+        for g in placed:
+            if (phase - g.phase) % self._gcd(group.period, g.period) == 0:
+                count += 1
+        return count
+
+    def _gcd(self, a, b):
+        while b:
+            a, b = b, a % b
+        return a
+
+    def next(self, full=False):
+        # groups due on the next tick; full: all groups (until every field
+        # has been read once)
+        if full:
+            due = list(self.groups)
+        else:
+            due = [g for g in self.groups
+                   if self._tick % g.period == g.phase]
+        self._tick += 1
+        return due
+
+
 class CraneX7Joint(object):
     # Control table address (Dynamixel-MX430/540)
+    RETURN_DELAY_TIME = ControlTable(9, 1)
     VELOCITY_LIMIT = ControlTable(44, 4)
     MAX_POSITION_LIMIT = ControlTable(48, 4)
     MIN_POSITION_LIMIT = ControlTable(52, 4)
     TORQUE_ENABLE = ControlTable(64, 1)
+    STATUS_RETURN_LEVEL = ControlTable(68, 1)
     HARDWARE_ERROR_STATUS = ControlTable(70, 1)
     POSITION_IGAIN = ControlTable(82, 2)
     POSITION_PGAIN = ControlTable(84, 2)
@@ -35,6 +673,27 @@ class CraneX7Joint(object):
     PRESENT_VELOCITY = ControlTable(128, 4)
     PRESENT_POSITION = ControlTable(132, 4)
     PRESENT_TEMPERATURE = ControlTable(146, 1)
+    INDIRECT_ADDRESS_1 = ControlTable(168, 2)
+    INDIRECT_DATA_1 = ControlTable(224, 1)
+
+    # Number of indirect address/data entries (Dynamixel-XM430/540)
+    INDIRECT_SIZE = 28
+
+    # Status fields mapped into the indirect data window (in this order,
+    # grouped from the fastest polled to the slowest polled)
+    STATUS_FIELDS = (PRESENT_CURRENT,
+                     PRESENT_VELOCITY,
+                     PRESENT_POSITION,
+                     MOVING,
+                     HARDWARE_ERROR_STATUS,
+                     TORQUE_ENABLE,
+                     PRESENT_TEMPERATURE,
+                     PROFILE_VELOCITY)
+
+    # EEPROM values (cannot change while torque on) kept in shadow cache
+    EEPROM_FIELDS = (VELOCITY_LIMIT,
+                     MAX_POSITION_LIMIT,
+                     MIN_POSITION_LIMIT)
 
     # Communication definitions
     PROTOCOL_VERSION = 2
@@ -52,16 +711,26 @@ class CraneX7Joint(object):
         self._tmp = 0
         self._err = 0
 
-        self._vlimit = self.vel_limit
-        self._max_pos = self.max_pos
-        self._min_pos = self.min_pos
+        # shadow register cache (address -> value)
+        self._cache = dict()
+        self._last_result = False
 
-    def _get_dxl_result(self):
+        # status packets for write instructions: Status Return Level is in
+        # RAM and keeps the value of an earlier open until power off
+        self._status_return_level = 2
+        level = self._read_dxl(self.STATUS_RETURN_LEVEL)
+        if self._last_result:
+            self._status_return_level = level
+        self._load_eeprom()
+
+    def _get_dxl_result(self, status=True):
         COMM_SUCCESS = 0
         result = dxl.getLastTxRxResult(self.port,
                                        self.PROTOCOL_VERSION)
-        err = dxl.getLastRxPacketError(self.port,
-                                       self.PROTOCOL_VERSION)
+        err = 0
+        if status:
+            err = dxl.getLastRxPacketError(self.port,
+                                           self.PROTOCOL_VERSION)
         if result != COMM_SUCCESS:
             logging.error(dxl.getTxRxResult(self.PROTOCOL_VERSION, result))
             return False
@@ -87,10 +756,13 @@ class CraneX7Joint(object):
                                     self.PROTOCOL_VERSION,
                                     self.id,
                                     control_table.address)
-        self._get_dxl_result()
+        self._last_result = self._get_dxl_result()
         return val
 
     def _write_dxl(self, control_table, value):
+        # without status packet for writes, send the instruction only
+        if self._status_return_level < 2:
+            return self._write_dxl_tx_only(control_table, value)
         if control_table.byte == 4:
             dxl.write4ByteTxRx(self.port,
                                self.PROTOCOL_VERSION,
@@ -111,6 +783,113 @@ class CraneX7Joint(object):
                                value)
         return self._get_dxl_result()
 
+    def _write_dxl_tx_only(self, control_table, value):
+        if control_table.byte == 4:
+            dxl.write4ByteTxOnly(self.port,
+                                 self.PROTOCOL_VERSION,
+                                 self.id,
+                                 control_table.address,
+                                 value)
+        elif control_table.byte == 2:
+            dxl.write2ByteTxOnly(self.port,
+                                 self.PROTOCOL_VERSION,
+                                 self.id,
+                                 control_table.address,
+                                 value)
+        else:
+            dxl.write1ByteTxOnly(self.port,
+                                 self.PROTOCOL_VERSION,
+                                 self.id,
+                                 control_table.address,
+                                 value)
+        return self._get_dxl_result(status=False)
+
+    def _read_cached(self, control_table):
+        # Read through the shadow register cache
+        val = self._cache.get(control_table.address)
+        if val is None:
+            val = self._read_dxl(control_table)
+            if self._last_result:
+                self._cache[control_table.address] = val
+        return val
+
+    def _write_cached(self, control_table, value):
+        # Write through the shadow register cache
+        if self._write_dxl(control_table, value):
+            self._cache[control_table.address] = value
+            return True
+        self._cache.pop(control_table.address, None)
+        return False
+
+    def shadow(self, control_table, value):
+        # Update the shadow cache for a value written by a group write
+        self._cache[control_table.address] = value
+
+    def invalidate(self, control_table=None):
+        # Drop shadow values (all if control_table is None).
+        # EEPROM values are reloaded from the servo immediately.
+        if control_table is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(control_table.address, None)
+        self._load_eeprom()
+
+    def _load_eeprom(self):
+        for control_table in self.EEPROM_FIELDS:
+            self._read_cached(control_table)
+        self._vlimit = self.vel_limit
+        self._max_pos = self.max_pos
+        self._min_pos = self.min_pos
+
+    def tune(self, profile):
+        # Apply bus tuning profile (Return Delay Time is in EEPROM area,
+        # so torque must be off; it is written only when it changes)
+        ok = True
+        if profile.return_delay_time is not None:
+            delay = self._read_dxl(self.RETURN_DELAY_TIME)
+            if not self._last_result or delay != profile.return_delay_time:
+                self._torque(0)
+                ok &= self._write_dxl(self.RETURN_DELAY_TIME,
+                                      profile.return_delay_time)
+        if profile.status_return_level is not None:
+            level = profile.status_return_level
+            if level < 2:
+                # no status packet is returned for this write itself
+                ok &= self._write_dxl_tx_only(self.STATUS_RETURN_LEVEL, level)
+            else:
+                ok &= self._write_dxl(self.STATUS_RETURN_LEVEL, level)
+            self._status_return_level = self._read_dxl(
+                self.STATUS_RETURN_LEVEL)
+            if self._status_return_level != level:
+                logging.error("joint[" + str(self._name) +
+                              "] cannot set status return level")
+                ok = False
+        return bool(ok)
+
+    @classmethod
+    def indirect_layout(cls, control_tables):
+        # Map each control table to its location in the indirect data window
+        layout = dict()
+        address = cls.INDIRECT_DATA_1.address
+        for t in control_tables:
+            layout[t.address] = ControlTable(address, t.byte)
+            address += t.byte
+        return layout
+
+    def map_indirect(self, control_tables):
+        # Program indirect address table (only writable while torque off)
+        if sum(t.byte for t in control_tables) > self.INDIRECT_SIZE:
+            logging.error("joint[" + str(self._name) + "] indirect overflow")
+            return False
+        self._torque(0)
+        entry = self.INDIRECT_ADDRESS_1.address
+        for t in control_tables:
+            for b in range(t.byte):
+                if not self._write_dxl(ControlTable(entry, 2), t.address + b):
+                    return False
+                entry += self.INDIRECT_ADDRESS_1.byte
+        return True
+
     def _torque(self, on_off):
         # Control Dynamixel Torque
         return self._write_dxl(self.TORQUE_ENABLE, on_off)
@@ -136,25 +915,35 @@ class CraneX7Joint(object):
         # Disable Dynamixel Torque
         self._torque(0)
 
-    def move(self, pos):
+    def goal(self, pos):
+        # Convert goal position in degree to raw value (None if out of range)
         p = self.deg2pos(pos)
-        if p > self.max_pos:
-            logging.error("joint[" + str(self._name) + "] cannot move: " + str(pos))
+        if not self.in_range(p):
+            return None
+        return p
+
+    def in_range(self, p):
+        # check raw goal position against the position limits
+        if p > self._max_pos or p <= self._min_pos:
+            logging.error("joint[" + str(self._name) + "] cannot move: " +
+                          str(self.pos2deg(p)))
             return False
-        elif p <= self.min_pos:
-            logging.error("joint[" + str(self._name) + "] cannot move: " + str(pos))
+        return True
+
+    def move(self, pos):
+        p = self.goal(pos)
+        if p is None:
             return False
         else:
             # Write goal position
-            logging.info("joint[" + str(self._name) + "] move: " + str(p))
             self._write_dxl(self.GOAL_POSITION, p)
             return True
 
     def pos2deg(self, pos):
-        return int((pos * 360.0 / 4096.0) - 180.0)
+        return (pos - POS_CENTER) * DEG_PER_TICK
 
     def deg2pos(self, deg):
-        return int((deg + 180.0) / (360.0 / 4096.0))
+        return int(round(deg / DEG_PER_TICK + POS_CENTER))
 
     @property
     def torque(self):
@@ -164,49 +953,49 @@ class CraneX7Joint(object):
     @property
     def vel_limit(self):
         # Read velocity limit
-        return self._read_dxl(self.VELOCITY_LIMIT)
+        return self._read_cached(self.VELOCITY_LIMIT)
 
     @property
     def pgain(self):
         # Read position P gain
-        return self._read_dxl(self.POSITION_PGAIN)
+        return self._read_cached(self.POSITION_PGAIN)
 
     @pgain.setter
     def pgain(self, val):
         # Write position P gain
-        self._write_dxl(self.POSITION_PGAIN, val)
+        self._write_cached(self.POSITION_PGAIN, val)
 
     @property
     def igain(self):
         # Read position I gain
-        return self._read_dxl(self.POSITION_IGAIN)
+        return self._read_cached(self.POSITION_IGAIN)
 
     @igain.setter
     def igain(self, val):
         # Write position I gain
-        self._write_dxl(self.POSITION_IGAIN, val)
+        self._write_cached(self.POSITION_IGAIN, val)
 
     @property
     def prof_acc(self):
         # Read acc profile
-        return self._read_dxl(self.PROFILE_ACCELERATION)
+        return self._read_cached(self.PROFILE_ACCELERATION)
 
     @prof_acc.setter
     def prof_acc(self, acc):
         # Write acc profile
         # 0-40 (unit=214.577[rev/min2])
-        self._write_dxl(self.PROFILE_ACCELERATION, acc)
+        self._write_cached(self.PROFILE_ACCELERATION, acc)
 
     @property
     def prof_vel(self):
         # Read velocity profile
-        return self._read_dxl(self.PROFILE_VELOCITY)
+        return self._read_cached(self.PROFILE_VELOCITY)
 
     @prof_vel.setter
     def prof_vel(self, vel):
         # Write velocity profile
         # 0-44 (unit=0.229[RPM])
-        self._write_dxl(self.PROFILE_VELOCITY, vel)
+        self._write_cached(self.PROFILE_VELOCITY, vel)
 
     @property
     def pos(self):
@@ -232,7 +1021,7 @@ class CraneX7Joint(object):
     @property
     def cur(self):
         # Read present current
-        self._cur = self._read_dxl(self.PRESENT_CURRENT)
+        self._cur = signed16(self._read_dxl(self.PRESENT_CURRENT))
         self._get_dxl_result()
         return self._cur
 
@@ -260,22 +1049,22 @@ class CraneX7Joint(object):
     @property
     def max_pos(self):
         # Read max position limit
-        return self._read_dxl(self.MAX_POSITION_LIMIT)
+        return self._read_cached(self.MAX_POSITION_LIMIT)
 
     @property
     def min_pos(self):
         # Read min position limit
-        return self._read_dxl(self.MIN_POSITION_LIMIT)
+        return self._read_cached(self.MIN_POSITION_LIMIT)
 
     @property
     def max_pos_in_deg(self):
         # Read max position limit
-        return self.pos2deg(self._read_dxl(self.MAX_POSITION_LIMIT))
+        return self.pos2deg(self.max_pos)
 
     @property
     def min_pos_in_deg(self):
         # Read min position limit
-        return self.pos2deg(self._read_dxl(self.MIN_POSITION_LIMIT))
+        return self.pos2deg(self.min_pos)
 
 
 class CraneX7(object):
@@ -285,38 +1074,140 @@ class CraneX7(object):
     # move offset for open/close gripper in degree
     GRIPPER_OFFSET = 5
 
+    # timeout of sync moves in second
+    MOVE_TIMEOUT = 2.0
+    HOME_TIMEOUT = 10.0
+    # timeout of a queued motion in second
+    MOTION_TIMEOUT = 10.0
+    GRIPPER_TIMEOUT = 1.5
+
+    # smoothing factor of the measured status rate
+    STATUS_RATE_FILTER = 0.1
+
+    # minimum return delay and no status packets for writes
+    BUS_PROFILE_LOW_LATENCY = BusProfile(return_delay_time=0,
+                                         status_return_level=1)
+
+    # number of transactions to measure the bus round-trip time
+    RTT_SAMPLES = 20
+
+    # usb-serial latency timer
+    LATENCY_TIMER = "/sys/bus/usb-serial/devices/{0}/latency_timer"
+
     def __init__(self, device="/dev/ttyUSB0".encode('utf-8'),
-                 baudrate=3000000):
+                 baudrate=3000000, control_rate=100.0,
+                 motion_status_rate=20.0, slow_status_rate=1.0,
+                 bus_profile=None, history_seconds=10.0,
+                 trace_capacity=4096, trace_path=None, motion_queue_size=16,
+                 workspace_path=None):
         logging.basicConfig(format='%(asctime)s:%(levelname)s: %(message)s',
                             level=logging.INFO)
         self._port = None
         self._device = device
         self._baudrate = baudrate
+        self._control_rate = float(control_rate)
+        # fixed-rate status loop on absolute deadlines
+        self._period = 1.0 / self._control_rate
+        self._deadline = None
+        self._loop_stats = LoopStats(self._period)
+        self._bus_profile = bus_profile
+        self._bus_rtt = None
         self.j = None
         self.hand = None
-        self._lock = threading.Lock()
+        # all serial I/O runs on the bus thread; commands from other threads
+        # and status reads are interleaved by priority
+        self._bus_queue = BusQueue()
+        self._command_latency = LatencyStats()
         self._loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self._loop)
+        # binary event trace, dumped to trace_path on faults
+        self._trace = TraceRecorder(trace_capacity, self._loop.time)
+        self._trace_path = trace_path
+        self._fault = False
         self._is_opened = False
 
-        self._pos = None
-        self._pos_hand = None
-        self._vel = None
-        self._cur = None
-        self._tmp = None
-        self._moving = None
-        self._err = None
-        self._all_prof_vel = None
-        self._torque_enable = None
+        # latest status snapshot (swapped atomically by the bus thread)
+        # and notification of new snapshots for sync waits
+        self._state = None
+        self._state_cond = threading.Condition()
+        # coroutine waits and state streams (bus thread only)
+        self._state_waiters = list()
+        self._state_streams = list()
+
+        # status history of the last history_seconds
+        self._history = TelemetryHistory(
+            max(1, int(history_seconds * self._control_rate)))
+
+        # goal dispatch by one sync write
+        self._goal_writer = None
+        self._prof_vel_writer = None
+        self._profile_goal_writer = None
+        # profile of the fastest joint of a move (per joint)
+        self._base_prof_vel = None
+        self._base_prof_acc = None
+
+        # status fields read by one sync read of the indirect data window;
+        # each group is polled at its own rate
+        self._status_groups = [
+            StatusGroup("position",
+                        [CraneX7Joint.PRESENT_CURRENT,
+                         CraneX7Joint.PRESENT_VELOCITY,
+                         CraneX7Joint.PRESENT_POSITION],
+                        self._control_rate),
+            StatusGroup("motion",
+                        [CraneX7Joint.MOVING,
+                         CraneX7Joint.HARDWARE_ERROR_STATUS],
+                        motion_status_rate),
+            StatusGroup("slow",
+                        [CraneX7Joint.TORQUE_ENABLE,
+                         CraneX7Joint.PRESENT_TEMPERATURE,
+                         CraneX7Joint.PROFILE_VELOCITY],
+                        slow_status_rate)]
+        self._status_scheduler = None
+        self._status_layout = None
+        self._status_readers = None
+        self._status_time = None
+        self._status_rate = 0.0
 
         # home position as 0
         self._home_pos_joints = [0 for x in range(7)]
+        # last commanded joint goal [deg]
+        self._goal_joints = None
+
+        # queued joint motions, run one after another by the bus thread;
+        # the lock only orders producers against each other
+        self._motion_queue_size = motion_queue_size
+        self._motions = collections.deque()
+        self._motion = None
+        self._motion_lock = threading.Lock()
+        self._motion_done = collections.deque(maxlen=32)
+
+        # forward kinematics of the latest snapshot, cached by its seq
+        self._kinematics = CraneX7Kinematics()
+        self._pose = None
+        # statistics of inverse kinematics solves
+        self._ik_time = LatencyStats()
+        self._ik_iterations = LatencyStats()
+        self._ik_result = None
+        # IK is solved on the callers' threads
+        self._ik_lock = threading.Lock()
+        # workspace index (directory, memory-mapped) for IK seeds
+        self._workspace_path = workspace_path
+        self._workspace = None
+
+        # streamed trajectory: (goal ticks per control cycle, start time,
+        # profile velocities to restore)
+        self._trajectory = None
+        # limits of Cartesian paths: speed of the control point [m/s] and
+        # of its rotation [rad/s], time to reach the speed [s]
+        self._max_speed_cartesian = (0.1, 1.0)
+        self._min_accel_time_cartesian = 0.2
 
         self._pause = False
 
     def loop_thread(self):
+        asyncio.set_event_loop(self._loop)
         self._loop.call_soon(self._open)
-        self._loop.call_later(0.01, self._status_updater, self._loop)
         self._loop.run_forever()
 
     def open(self):
@@ -350,6 +1241,8 @@ class CraneX7(object):
             self._port = None
             return False
 
+        self._check_latency_timer()
+
         # Initialize joint setting
         self.j = list()
         self.j.append(CraneX7Joint("link1", 2, self._port))
@@ -361,25 +1254,141 @@ class CraneX7(object):
         self.j.append(CraneX7Joint("link7", 8, self._port))
         self.hand = CraneX7Joint("hand", 9, self._port)
 
+        rtt = self._measure_rtt(self.j[0].id)
+        if self._bus_profile:
+            for j in self.j + [self.hand]:
+                if not j.tune(self._bus_profile):
+                    logging.error("joint[" + str(j._name) + "]: cannot tune")
+        self._bus_rtt = (rtt, self._measure_rtt(self.j[0].id))
+        logging.info("bus round-trip time [ms]: {0:.3f} -> {1:.3f}".format(
+            self._bus_rtt[0] * 1000.0, self._bus_rtt[1] * 1000.0))
+
+        # map every status field into one indirect data window
+        for j in self.j + [self.hand]:
+            if not j.map_indirect(CraneX7Joint.STATUS_FIELDS):
+                logging.error("joint[" + str(j._name) + "]: cannot map status")
+        self._status_layout = CraneX7Joint.indirect_layout(
+            CraneX7Joint.STATUS_FIELDS)
+        self._status_scheduler = StatusScheduler(self._control_rate,
+                                                 self._status_groups)
+
+        # one reader per window length: the fields of the due groups are
+        # fetched by a single sync read from the head of the window
+        self._status_readers = dict()
+        length = 0
+        for g in self._status_groups:
+            length += sum(t.byte for t in g.control_tables)
+            self._status_readers[g.name] = SyncReader(
+                self._port, CraneX7Joint.PROTOCOL_VERSION,
+                CraneX7Joint.INDIRECT_DATA_1.address, length,
+                [j.id for j in self.j] + [self.hand.id])
+
+        self._goal_writer = SyncWriter(
+            self._port, CraneX7Joint.PROTOCOL_VERSION,
+            [CraneX7Joint.GOAL_POSITION], self._trace)
+        self._prof_vel_writer = SyncWriter(
+            self._port, CraneX7Joint.PROTOCOL_VERSION,
+            [CraneX7Joint.PROFILE_VELOCITY], self._trace)
+        self._profile_goal_writer = SyncWriter(
+            self._port, CraneX7Joint.PROTOCOL_VERSION,
+            [CraneX7Joint.PROFILE_ACCELERATION, CraneX7Joint.PROFILE_VELOCITY,
+             CraneX7Joint.GOAL_POSITION], self._trace)
+
         for j in self.j:
             j.torque_on()
         self.hand.torque_on()
+        self._base_prof_vel = [j.prof_vel or j._vlimit for j in self.j]
+        self._base_prof_acc = [j.prof_acc for j in self.j]
 
         # get gripper piosition (offsets to prevent crash)
         self._close_pos_hand = self.hand.min_pos_in_deg + self.GRIPPER_OFFSET
         self._open_pos_hand = self.hand.max_pos_in_deg - self.GRIPPER_OFFSET
 
+        if self._workspace_path:
+            # loaded (or built) in the background, not on the bus thread;
+            # IK starts from the present position until it is ready
+            thread = threading.Thread(target=self._load_workspace,
+                                      args=(self._workspace_path,))
+            thread.setDaemon(True)
+            thread.start()
+
         self._is_opened = True
 
+        # the fixed-rate loop starts from here: opening takes a while and
+        # an earlier deadline would count the first cycles as overrun
+        self._deadline = self._loop.time() + self._period
+        self._loop.call_at(self._deadline, self._status_updater, self._loop)
         return True
 
+    def _check_latency_timer(self):
+        # usb-serial driver holds received bytes up to latency_timer [ms]
+        device = self._device
+        if isinstance(device, bytes):
+            device = device.decode("utf-8")
+        tty = os.path.basename(os.path.realpath(device))
+        try:
+            with open(self.LATENCY_TIMER.format(tty)) as f:
+                latency = int(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+        if latency != 1:
+            logging.warn("latency_timer of " + tty + " is " + str(latency) +
+                         " ms (recommended: 1 ms)")
+        return latency
+
+    def _measure_rtt(self, mid):
+        # mean round-trip time [s] of a single read transaction
+        start = time.time()
+        for i in range(self.RTT_SAMPLES):
+            dxl.read4ByteTxRx(self._port, CraneX7Joint.PROTOCOL_VERSION, mid,
+                              CraneX7Joint.PRESENT_POSITION.address)
+        return (time.time() - start) / self.RTT_SAMPLES
+
     def close(self):
-        self._loop.call_soon(self._close)
-        self._loop.stop()
+        self._submit(self._close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
         return True
 
+    def _submit(self, command, *args):
+        # Queue a command from any thread and wake up the bus thread
+        self._bus_queue.push(BusQueue.COMMAND, self._loop.time(),
+                             command, args)
+        self._loop.call_soon_threadsafe(self._run_bus)
+
+    def _run_bus(self):
+        # Run queued work on the bus thread in priority order; commands
+        # queued while a status read is on the bus go ahead of the next one
+        while True:
+            item = self._bus_queue.pop()
+            if item is None:
+                return
+            priority, submitted, work, args = item
+            if priority == BusQueue.COMMAND:
+                start = self._loop.time()
+                self._command_latency.add(start - submitted)
+                result = self._run_work(work, args)
+                self._trace.record(start, TraceRecorder.COMMAND, 0,
+                                   self._trace.code(work.__name__),
+                                   self._loop.time() - start,
+                                   int((start - submitted) * 1e6))
+                if result is False:
+                    self._trace.record(start, TraceRecorder.ERROR)
+            else:
+                self._run_work(work, args)
+
+    def _run_work(self, work, args):
+        # a failing work item must not stop the bus thread and the items
+        # queued behind it
+        try:
+            return work(*args)
+        except Exception:
+            logging.exception("bus: " + work.__name__ + " failed")
+            self._trace.record(self._loop.time(), TraceRecorder.ERROR)
+            return None
+
     def _close(self):
         if self.j:
+            self._clear_motions()
             for j in self.j:
                 j.torque_off()
                 del j
@@ -395,31 +1404,55 @@ class CraneX7(object):
             dxl.closePort(self._port)
             self._port = None
 
+        self._goal_writer = None
+        self._prof_vel_writer = None
+        self._profile_goal_writer = None
+        self._status_scheduler = None
+        self._status_layout = None
+        self._status_readers = None
+        self._status_time = None
+        self._status_rate = 0.0
         self._is_opened = False
         return True
 
-    def _wait_for_reach_joints(self, goals, count=20):
-        # wait until reach goal or timeout (expire count)
-        for i in range(count):
-            match = 0
-            for i, j in enumerate(self.j):
-                if abs(goals[i] - self._pos[i]) < self.MOVE_THRESHOLD:
-                    match += 1
-                    if match == 7:
-                        logging.info("Reach goal position")
-                        return True
-                time.sleep(0.01)
+    def _wait_for_state(self, reached, timeout):
+        # block until a snapshot satisfies reached(state) or the deadline
+        deadline = self._loop.time() + timeout
+        with self._state_cond:
+            while True:
+                state = self._state
+                if state and reached(state):
+                    return True
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    return False
+                self._state_cond.wait(remaining)
+
+    def _joints_reached(self, goals, state):
+        for i in range(len(goals)):
+            if abs(goals[i] - state.pos[i]) >= self.MOVE_THRESHOLD:
+                return False
+        return True
+
+    def _wait_for_reach_joints(self, goals, timeout=MOVE_TIMEOUT):
+        # wait until reach goal or timeout [s]
+        if self._wait_for_state(
+                lambda state: self._joints_reached(goals, state), timeout):
+            logging.info("Reach goal position")
+            return True
         logging.warn("timeout: not yet reach goal position " + str(self.pos))
         return False
 
-    def _wait_for_reach_hand(self, goal, count=150):
-        # wait until reach goal or timeout (expire count)
-        for i in range(count):
-            if abs(goal - self._pos_hand) < self.MOVE_THRESHOLD:
-                logging.info("Reach goal position")
-                return True
-            time.sleep(0.01)
-        logging.warn("timeout: not yet reach goal position " + str(self.hand.pos_in_deg))
+    def _wait_for_reach_hand(self, goal, timeout=GRIPPER_TIMEOUT):
+        # wait until reach goal or timeout [s]
+        if self._wait_for_state(
+                lambda state: abs(goal - state.pos_hand) < self.MOVE_THRESHOLD,
+                timeout):
+            logging.info("Reach goal position")
+            return True
+        state = self._state
+        logging.warn("timeout: not yet reach goal position " +
+                     str(state.pos_hand if state else None))
         return False
 
     def home(self, sync=False):
@@ -427,21 +1460,52 @@ class CraneX7(object):
         if not self.j:
             logging.error("move home: not yet initialized")
             return False
-        self._loop.call_soon(self._home)
+        self._goal_joints = self._home_pos_joints
+        self._submit(self._home)
         if sync:
             # wait until reach goal or timeout (expire count)
-            self._wait_for_reach_joints(self._home_pos_joints, count=100)
+            self._wait_for_reach_joints(self._home_pos_joints,
+                                        timeout=self.HOME_TIMEOUT)
         return True
 
     def _home(self):
-        with self._lock:
-            for i, j in enumerate(self.j):
-                if not j.move(self._home_pos_joints[i]):
-                    logging.error("move j[" + str(i) + "]: cannot move")
-                    return False
+        self._clear_motions()
+        return self._move_joints(self._home_pos_joints)
+
+    def _move_joints(self, pos, ratio=None):
+        # Write profile accelerations, profile velocities and goal
+        # positions of all joints by one sync write so that every joint
+        # starts on the same tick and finishes together
+        goals = deg2ticks(pos[:len(self.j)]).tolist()
+        for i, (j, p) in enumerate(zip(self.j, goals)):
+            if not j.in_range(p):
+                logging.error("move j[" + str(i) + "]: cannot move")
+                return False
+        if ratio is not None:
+            self._base_prof_vel = [self._ratio_to_prof_vel(j, ratio)
+                                   for j in self.j]
+
+        acc, vel = self._sync_profile(goals)
+        if not self._profile_goal_writer.write(
+                [(j.id, values)
+                 for j, values in zip(self.j, zip(acc, vel, goals))]):
+            return False
+        for j, a, v in zip(self.j, acc, vel):
+            j.shadow(CraneX7Joint.PROFILE_ACCELERATION, a)
+            j.shadow(CraneX7Joint.PROFILE_VELOCITY, v)
         return True
 
-    def movej(self, pos, sync=False):
+    def _sync_profile(self, goals):
+        # profiles of the base velocities which finish every joint together
+        travel = np.array(goals) - np.array([j._pos for j in self.j])
+        return sync_profile(travel, self._base_prof_acc, self._base_prof_vel,
+                            [j._vlimit for j in self.j])
+
+    def _ratio_to_prof_vel(self, j, ratio):
+        return int(j._vlimit * ratio / 100.0)
+
+    def movej(self, pos, sync=False, ratio=None):
+        # ratio: profile velocity [%] sent together with the goals
         logging.info("movej [deg]: " + str(pos))
         if not self.j:
             logging.error("movej: not yet initialized")
@@ -449,34 +1513,370 @@ class CraneX7(object):
         if self._pause is True:
             logging.error("movej: now state is pause")
             return False
-        self._loop.call_soon(self._movej, pos)
+        self._goal_joints = pos
+        self._submit(self._movej, pos, ratio)
         if sync:
             # wait until reach goal or timeout (expire count)
             self._wait_for_reach_joints(pos)
         return True
 
-    def _movej(self, pos):
-        with self._lock:
-            for i, j in enumerate(self.j):
-                if not j.move(pos[i]):
-                    logging.error("move j[" + str(i) + "]: cannot move")
-                    return False
+    def _movej(self, pos, ratio=None):
+        # a direct move replaces the queued motions
+        self._clear_motions()
+        return self._move_joints(pos, ratio)
+
+    def queue_movej(self, pos, ratio=None):
+        # append a joint motion [deg] to the motion queue; it starts when
+        # the previous one reached its goal (False if the queue is full)
+        if not self.j:
+            logging.error("queue_movej: not yet initialized")
+            return False
+        if self._pause is True:
+            logging.error("queue_movej: now state is pause")
+            return False
+        with self._motion_lock:
+            if self.motion_queue_len >= self._motion_queue_size:
+                return False
+            self._motions.append((list(pos), ratio))
+        self._submit(self._advance_motions)
         return True
 
+    def clear_motions(self):
+        self._submit(self._clear_motions)
+        return True
+
+    def _clear_motions(self):
+        # drop the queued motions and a streamed trajectory
+        self._motions.clear()
+        self._motion = None
+        if self._trajectory:
+            self._stop_trajectory()
+
+    def _target_pose(self, pose, elbow, relative):
+        # relative: translation added to and rotation applied (in the base
+        # frame) to the present pose, elbow added to the present one
+        pose = np.asarray(pose, dtype=np.float64)
+        if not relative:
+            return pose, elbow
+        present, swivel = self.pose
+        target = np.empty((3, 4))
+        target[:, :3] = pose[:, :3].dot(present[:, :3])
+        target[:, 3] = present[:, 3] + pose[:, 3]
+        if elbow is not None:
+            elbow = swivel + elbow
+        return target, elbow
+
+    def _joint_limits(self):
+        # position limits of the joints [rad]
+        return (ticks2rad([j._min_pos + 1 for j in self.j]),
+                ticks2rad([j._max_pos for j in self.j]))
+
+    def _max_step(self):
+        # largest move of the joints in a control period [rad]
+        return np.array([j._vlimit for j in self.j]) * \
+            RAD_PER_SEC_PER_VEL * self._period
+
+    def _load_workspace(self, path):
+        # map the workspace index at path; build it (and save it to path)
+        # when there is none or it was sampled within other joint limits
+        lower, upper = self._joint_limits()
+        try:
+            index = WorkspaceIndex.load(path)
+            if np.allclose(index.limits, [lower, upper]):
+                logging.info("workspace index: {0} samples".format(
+                    len(index)))
+                self._workspace = index
+                return
+            logging.info("workspace index: joint limits changed")
+        except (IOError, ValueError):
+            logging.info("workspace index: not found in " + path)
+        start = time.time()
+        index = WorkspaceIndex.build(self._kinematics, lower, upper)
+        logging.info("workspace index: built {0} samples in {1:.1f} s"
+                     .format(len(index), time.time() - start))
+        try:
+            index.save(path)
+        except (IOError, OSError) as e:
+            logging.warn("workspace index: cannot save: " + str(e))
+        self._workspace = index
+
+    def _ik(self, pose, elbow, q0):
+        # solve within the position limits and keep the statistics
+        lower, upper = self._joint_limits()
+        result = self._kinematics.ik(pose, elbow, q0, lower, upper)
+        with self._ik_lock:
+            self._ik_time.add(result.solve_time)
+            self._ik_iterations.add(result.iterations)
+            self._ik_result = result
+        return result
+
+    def solve_ik(self, pose, elbow=None, relative=False):
+        # joint angles [deg] for a pose (3 x 4 [m]) and elbow [rad] or None
+        # (relative: see _target_pose). Starts from the nearest sample of
+        # the workspace index, or the present snapshot without an index or
+        # if that fails, and keeps the joints within the position limits
+        if not self.j or self.pos is None:
+            logging.error("solve_ik: not yet initialized")
+            return None
+        pose, elbow = self._target_pose(pose, elbow, relative)
+        result = None
+        if self._workspace is not None:
+            # a free elbow prefers samples near the present one
+            seed = self._workspace.seed(
+                pose, self.pose[1] if elbow is None else elbow)
+            if seed is not None:
+                result = self._ik(pose, elbow, seed)
+        if result is None or not result.success:
+            result = self._ik(pose, elbow, np.radians(self.pos))
+        if not result.success:
+            logging.error("solve_ik: no solution (error {0:.4f} m, "
+                          "{1:.4f} rad)".format(result.pos_error,
+                                                result.rot_error))
+            return None
+        if result.elbow_error >= self._kinematics.IK_ELBOW_TOLERANCE:
+            logging.warn("solve_ik: elbow not reached (error {0:.3f} rad)"
+                         .format(result.elbow_error))
+        return np.degrees(result.q).tolist()
+
+    def move_pose(self, pose, elbow=None, relative=False, queue=False,
+                  sync=False):
+        # PTP move to a Cartesian pose (see solve_ik); queue: append to the
+        # motion queue instead of moving at once
+        pos = self.solve_ik(pose, elbow, relative)
+        if pos is None:
+            return False
+        if queue:
+            return self.queue_movej(pos)
+        return self.movej(pos, sync=sync)
+
+    def move_linear(self, pose, elbow=None, relative=False, sync=False):
+        # straight-line move of the control point to a pose (see solve_ik;
+        # elbow None: keep the present one) within the Cartesian speed
+        # limits; the joint goals of every control period are solved
+        # before the move and streamed at the control rate
+        return self._move_path("move_linear", None, pose, elbow, relative,
+                               sync)
+
+    def move_circular(self, via, pose, elbow=None, relative=False,
+                      sync=False):
+        # arc move through the position of via to a pose at constant speed
+        # of the control point, otherwise as move_linear (relative: both
+        # poses relative to the present one)
+        return self._move_path("move_circular", via, pose, elbow, relative,
+                               sync)
+
+    def _move_path(self, name, via, pose, elbow, relative, sync):
+        if not self.j or self.pos is None:
+            logging.error(name + ": not yet initialized")
+            return False
+        if self._pause is True:
+            logging.error(name + ": now state is pause")
+            return False
+        # the path is solved from the present position: it must stay there
+        if self.motion_queue_len or self._trajectory is not None:
+            logging.error(name + ": the arm is moving")
+            return False
+        q0 = np.radians(self.pos)
+        start, swivel = self.pose
+        pose, elbow = self._target_pose(pose, elbow, relative)
+        if elbow is None:
+            elbow = swivel
+        # the goal must be reachable before the arm starts along the path
+        result = self._ik(pose, elbow, q0)
+        if not result.success:
+            logging.error(name + ": no solution for the goal")
+            return False
+
+        if via is None:
+            path = LinearPath(start, pose, swivel, elbow)
+        else:
+            via, _ = self._target_pose(via, None, relative)
+            try:
+                path = CircularPath(start, via, pose, swivel, elbow)
+            except ValueError as e:
+                logging.error(name + ": " + str(e))
+                return False
+        speed, angular_speed = self._max_speed_cartesian
+        profile = TrapezoidProfile(max(path.length / speed,
+                                       path.angle / angular_speed),
+                                   self._min_accel_time_cartesian)
+        ticks = self._solve_path(name, path, profile, q0)
+        if ticks is None:
+            return False
+
+        goal = ticks2deg(ticks[-1]).tolist()
+        self._goal_joints = goal
+        self._submit(self._start_trajectory, ticks)
+        if sync:
+            self._wait_for_reach_joints(goal, timeout=profile.duration +
+                                        self.MOVE_TIMEOUT)
+        return True
+
+    def _solve_path(self, name, path, profile, q0):
+        # joint goals [ticks] of every control period along the path, each
+        # solved from the previous one before the move starts (the bus
+        # thread only streams them); None if a point has no solution or a
+        # joint would move faster than its velocity limit
+        max_step = self._max_step()
+        n = int(np.ceil(profile.duration / self._period)) + 1
+        goals = np.empty((n, len(self.j)))
+        q = q0
+        for i in range(n):
+            pose, elbow = path(profile(i * self._period))
+            result = self._ik(pose, elbow, q)
+            if not result.success:
+                logging.error("{0}: no solution at {1:.2f} s".format(
+                    name, i * self._period))
+                return None
+            if np.any(np.abs(result.q - q) > max_step):
+                logging.error("{0}: joint velocity limit at {1:.2f} s"
+                              .format(name, i * self._period))
+                return None
+            q = goals[i] = result.q
+        return rad2ticks(goals)
+
+    def set_max_speed_cartesian(self, speed, angular_speed):
+        # limits of straight-line moves [m/s], [rad/s]
+        if speed <= 0 or angular_speed <= 0:
+            logging.error("set_max_speed_cartesian: speed must be positive")
+            return False
+        self._max_speed_cartesian = (float(speed), float(angular_speed))
+        return True
+
+    def set_min_accel_time_cartesian(self, accel_time):
+        # time [s] to reach the speed of straight-line moves
+        if accel_time < 0:
+            logging.error("set_min_accel_time_cartesian: negative time")
+            return False
+        self._min_accel_time_cartesian = float(accel_time)
+        return True
+
+    def move_trajectory(self, waypoints, method="cubic", sync=False):
+        # waypoints: list of (time [s] from now, joint positions [deg]);
+        # the goals are interpolated and streamed at the control rate
+        if not self.j:
+            logging.error("move_trajectory: not yet initialized")
+            return False
+        if self._pause is True:
+            logging.error("move_trajectory: now state is pause")
+            return False
+        times = [float(t) for t, p in waypoints]
+        points = [list(p) for t, p in waypoints]
+        if times and times[0] > 0.0:
+            # start from the present position
+            if self.pos is None:
+                logging.error("move_trajectory: no present position")
+                return False
+            times.insert(0, 0.0)
+            points.insert(0, list(self.pos))
+        try:
+            traj = JointTrajectory(times, points, method)
+        except ValueError as e:
+            logging.error("move_trajectory: " + str(e))
+            return False
+
+        # goals of every control cycle, converted and checked at once
+        n = int(np.ceil(traj.duration / self._period)) + 1
+        ticks = deg2ticks(traj.sample(times[0] + self._period * np.arange(n)))
+        max_pos = np.array([j._max_pos for j in self.j])
+        min_pos = np.array([j._min_pos for j in self.j])
+        if np.any(ticks > max_pos) or np.any(ticks <= min_pos):
+            logging.error("move_trajectory: out of the position limits")
+            return False
+        # one tick of rounding on top of the velocity limit
+        max_step = self._max_step() / RAD_PER_TICK + 1
+        if np.any(np.abs(np.diff(ticks, axis=0)) > max_step):
+            logging.error("move_trajectory: over the joint velocity limits")
+            return False
+        if self.pos is None or \
+           np.any(np.abs(ticks[0] - deg2ticks(self.pos)) > max_step):
+            logging.error("move_trajectory: not starting at the present "
+                          "position")
+            return False
+
+        self._goal_joints = points[-1]
+        self._submit(self._start_trajectory, ticks)
+        if sync:
+            self._wait_for_reach_joints(points[-1],
+                                        timeout=traj.duration +
+                                        self.MOVE_TIMEOUT)
+        return True
+
+    def _start_trajectory(self, ticks):
+        # the goals were computed from an earlier position; refuse them if
+        # the arm has moved away since (e.g. a command queued before)
+        state = self._state
+        max_step = self._max_step() / RAD_PER_TICK + 1
+        if state is None or \
+           np.any(np.abs(ticks[0] - deg2ticks(state.pos)) > max_step):
+            logging.error("trajectory: not starting at the present position")
+            return False
+        # no profile while streaming: every goal is followed at once
+        self._clear_motions()
+        prof_vel = [j.prof_vel for j in self.j]
+        if not self._write_prof_vel([0] * len(self.j)):
+            return False
+        self._trajectory = (ticks, self._loop.time(), prof_vel)
+        return self._stream_trajectory()
+
+    def _stream_trajectory(self):
+        # a command queued before this cycle's goal may have stopped it
+        if self._trajectory is None:
+            return True
+        ticks, start, prof_vel = self._trajectory
+        i = min(int(round((self._loop.time() - start) / self._period)),
+                len(ticks) - 1)
+        ok = self._goal_writer.write(
+            [(j.id, (p,)) for j, p in zip(self.j, ticks[i].tolist())])
+        if not ok or i == len(ticks) - 1:
+            self._stop_trajectory()
+        return ok
+
+    def _stop_trajectory(self):
+        ticks, start, prof_vel = self._trajectory
+        self._trajectory = None
+        return self._write_prof_vel(prof_vel)
+
+    def _advance_motions(self):
+        # start the next queued motion once the running one reached its
+        # goal; a motion which fails or times out clears the queue
+        state = self._state
+        now = self._loop.time()
+        if self._motion:
+            goal, start = self._motion
+            if state and self._joints_reached(goal, state):
+                self._motion = None
+                self._motion_done.append(now)
+            elif now - start > self.MOTION_TIMEOUT:
+                logging.warn("motion queue: timeout, queue cleared")
+                self._trace.record(now, TraceRecorder.ERROR)
+                self._clear_motions()
+                return
+            else:
+                return
+        if self._motions and self._pause is not True and \
+                not self._trajectory:
+            goal, ratio = self._motions.popleft()
+            if not self._move_joints(goal, ratio):
+                self._trace.record(now, TraceRecorder.ERROR)
+                self._clear_motions()
+                return
+            self._goal_joints = goal
+            self._motion = (goal, now)
+
     def open_gripper(self, sync=False):
         logging.info("open gripper: sync=" + str(sync))
         if not self.hand:
             logging.error("gripper: not yet initialized")
             return False
-        self._loop.call_soon(self._open_gripper, sync)
+        self._submit(self._open_gripper, sync)
         if sync:
             # wait until reach goal or timeout (expire count)
             self._wait_for_reach_hand(self._open_pos_hand)
         return True
 
     def _open_gripper(self, sync=False):
-        with self._lock:
-            self.hand.move(self._open_pos_hand)
+        self.hand.move(self._open_pos_hand)
         return True
 
     def close_gripper(self, sync=False):
@@ -484,15 +1884,14 @@ class CraneX7(object):
         if not self.hand:
             logging.error("gripper: not yet initialized")
             return False
-        self._loop.call_soon(self._close_gripper)
+        self._submit(self._close_gripper)
         if sync:
             # wait until reach goal or timeout (expire count)
             self._wait_for_reach_hand(self._close_pos_hand)
         return True
 
     def _close_gripper(self):
-        with self._lock:
-            self.hand.move(self._close_pos_hand)
+        self.hand.move(self._close_pos_hand)
         return True
 
     def move_gripper(self, ratio=0, sync=False):
@@ -503,15 +1902,14 @@ class CraneX7(object):
 
         pos = self._open_pos_hand * ratio / 100.0
 
-        self._loop.call_soon(self._move_gripper, pos)
+        self._submit(self._move_gripper, pos)
         if sync:
             # wait until reach goal or timeout (expire count)
             self._wait_for_reach_hand(pos)
         return True
 
     def _move_gripper(self, pos=0):
-        with self._lock:
-            self.hand.move(pos)
+        self.hand.move(pos)
         return True
 
     def servo_on(self):
@@ -519,128 +1917,434 @@ class CraneX7(object):
         if not self.j:
             logging.error("joint: not yet initialized")
             return False
-        self._loop.call_soon(self._servo_on)
+        self._submit(self._servo_on)
         return True
 
     def _servo_on(self):
-        with self._lock:
-            for i, j in enumerate(self.j):
-                if not j._torque(1):
-                    return False
-            return True
+        for i, j in enumerate(self.j):
+            if not j._torque(1):
+                return False
+        return True
 
     def servo_off(self):
         logging.info("servo off")
         if not self.j:
             logging.error("joint: not yet initialized")
             return False
-        self._loop.call_soon(self._servo_off)
+        self._submit(self._servo_off)
         return True
 
     def _servo_off(self):
-        with self._lock:
-            for i, j in enumerate(self.j):
-                if not j._torque(0):
-                    return False
-            return True
+        for i, j in enumerate(self.j):
+            if not j._torque(0):
+                return False
+        return True
 
     def set_prof_vel(self, ratio):
         logging.info("call set_prof_vel")
         if not self.j:
             logging.error("set_prof_vel: not yet initialized")
             return False
-        self._loop.call_soon(self._set_prof_vel, ratio)
+        self._submit(self._set_prof_vel, ratio)
         return True
 
     def _set_prof_vel(self, ratio):
-        with self._lock:
-            for i, j in enumerate(self.j):
-                j.prof_vel = int(j._vlimit * ratio / 100.0)
+        self._base_prof_vel = [self._ratio_to_prof_vel(j, ratio)
+                               for j in self.j]
+        return self._write_prof_vel(self._base_prof_vel)
+
+    def _write_prof_vel(self, values):
+        if not self._prof_vel_writer.write(
+                [(j.id, (v,)) for j, v in zip(self.j, values)]):
+            return False
+        for j, v in zip(self.j, values):
+            j.shadow(CraneX7Joint.PROFILE_VELOCITY, v)
         return True
 
+    # Coroutine API: run on the bus loop (see run_coroutine), so that one
+    # thread can wait on several motions and other I/O at once
+    @asyncio.coroutine
+    def movej_async(self, pos, ratio=None, timeout=MOVE_TIMEOUT):
+        # move and wait until reach goal or timeout [s]
+        if not self.movej(pos, ratio=ratio):
+            raise Return(False)
+        result = yield From(self.reached(pos, timeout))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def home_async(self, timeout=HOME_TIMEOUT):
+        if not self.home():
+            raise Return(False)
+        result = yield From(self.reached(self._home_pos_joints, timeout))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def gripper(self, ratio=0, timeout=GRIPPER_TIMEOUT):
+        # move gripper to ratio [%] of open and wait until reach
+        if not self.move_gripper(ratio):
+            raise Return(False)
+        goal = self._open_pos_hand * ratio / 100.0
+        result = yield From(self._wait_for_state_async(
+            lambda state: abs(goal - state.pos_hand) < self.MOVE_THRESHOLD,
+            timeout))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def reached(self, goals=None, timeout=MOVE_TIMEOUT):
+        # wait until reach goals (default: last commanded goal) or timeout
+        if goals is None:
+            goals = self._goal_joints
+        if goals is None:
+            raise Return(True)
+        result = yield From(self._wait_for_state_async(
+            lambda state: self._joints_reached(goals, state), timeout))
+        if not result:
+            logging.warn("timeout: not yet reach goal position " +
+                         str(self.pos))
+        raise Return(result)
+
+    def states(self, maxsize=1):
+        # StateStream of new snapshots (call on the bus loop)
+        return StateStream(self._state_streams, maxsize)
+
+    @asyncio.coroutine
+    def _wait_for_state_async(self, reached, timeout):
+        state = self._state
+        if state and reached(state):
+            raise Return(True)
+        waiter = (reached, asyncio.Future())
+        self._state_waiters.append(waiter)
+        try:
+            yield From(asyncio.wait_for(waiter[1], timeout))
+        except asyncio.TimeoutError:
+            raise Return(False)
+        finally:
+            self._state_waiters.remove(waiter)
+        raise Return(True)
+
+    def run_coroutine(self, coro):
+        # Run a coroutine on the bus loop from another thread and return
+        # a concurrent.futures.Future of its result
+        future = concurrent.futures.Future()
+
+        def done(task):
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start():
+            if future.set_running_or_notify_cancel():
+                asyncio.ensure_future(coro).add_done_callback(done)
+
+        self._loop.call_soon_threadsafe(start)
+        return future
+
     def _status_updater(self, loop):
         if not self.j:
             return
+        now = loop.time()
+        self._loop_stats.start(now, self._deadline)
+        self._trace.record(now, TraceRecorder.CYCLE, 0, 0,
+                           now - self._deadline,
+                           self._state.seq if self._state else -1)
+
+        # the trajectory goal of this cycle and the status read are
+        # queued behind pending commands
+        if self._trajectory:
+            self._bus_queue.push(BusQueue.COMMAND, now,
+                                 self._stream_trajectory)
+        self._bus_queue.push(BusQueue.STATUS, loop.time(),
+                             self._read_status, (loop,))
+        try:
+            self._run_bus()
+        finally:
+            # the fixed-rate loop keeps running whatever happened
+            self._schedule_next(loop)
 
-        pos = list()
-        with self._lock:
-            for j in self.j:
-                pos.append(j.pos_in_deg)
-        self._pos = pos
-
-        with self._lock:
-            self._pos_hand = self.hand.pos_in_deg
-
-        vel = list()
-        with self._lock:
-            for j in self.j:
-                vel.append(j.vel)
-        self._vel = vel
+    def _read_status(self, loop):
+        if not self.j:
+            return
+        # read from the head of the window up to the last due group; all
+        # groups until the first snapshot, which has every field
+        due = self._status_scheduler.next(full=self._state is None)
+        groups = self._status_groups[:self._status_groups.index(due[-1]) + 1]
+        reader = self._status_readers[due[-1].name]
+        start = loop.time()
+        ok = reader.read()
+        cycle_time = loop.time() - start
+        self._trace.record(start, TraceRecorder.BUS_READ, len(groups), 0,
+                           cycle_time, int(ok))
+        if ok:
+            state = self._decode_status(reader, groups, start, cycle_time)
+            self._publish(state)
+            self._check_fault(state.err != 0)
+            if self._motion or self._motions:
+                self._advance_motions()
+        else:
+            self._check_fault(True)
+        self._update_status_rate(start)
 
-        cur = list()
-        with self._lock:
+    def _check_fault(self, fault):
+        # trace the servos with hardware errors and dump on a new fault
+        if fault and not self._fault:
+            now = self._loop.time()
             for j in self.j:
-                cur.append(j.cur)
-        self._cur = cur
-
-        tmp = list()
-        with self._lock:
+                if j._err:
+                    self._trace.record(now, TraceRecorder.ERROR, j.id, j._err)
+            if self._trace_path:
+                self.dump_trace(self._trace_path)
+        self._fault = fault
+
+    def _schedule_next(self, loop):
+        # next deadline on the fixed grid; deadlines which already passed
+        # are counted as overrun and skipped instead of slowing the loop
+        deadline = self._deadline + self._period
+        now = loop.time()
+        if now >= deadline:
+            missed = int((now - self._deadline) / self._period)
+            self._loop_stats.overrun(now - deadline, missed)
+            self._trace.record(now, TraceRecorder.OVERRUN, 0, 0,
+                               now - deadline, missed)
+            deadline = self._deadline + (missed + 1) * self._period
+        self._deadline = deadline
+        loop.call_at(deadline, self._status_updater, loop)
+
+    def _publish(self, state):
+        # swap in the new snapshot and wake up the sync waits
+        self._history.append(state)
+        with self._state_cond:
+            self._state = state
+            self._state_cond.notify_all()
+        for reached, future in self._state_waiters:
+            if not future.done() and reached(state):
+                future.set_result(True)
+        for stream in self._state_streams:
+            stream.put(state)
+
+    def _decode_status(self, reader, groups, stamp, cycle_time):
+        # Build a new snapshot; fields which are not read in this cycle
+        # are taken over from the previous snapshot
+        layout = self._status_layout
+        names = [g.name for g in groups]
+        prev = self._state
+
+        for j in self.j + [self.hand]:
+            j._pos = reader.get(j.id, layout[j.PRESENT_POSITION.address],
+                                j._pos)
+        for j in self.j:
+            j._vel = reader.get(j.id, layout[j.PRESENT_VELOCITY.address],
+                                j._vel)
+            # Present Current is signed
+            j._cur = signed16(reader.get(
+                j.id, layout[j.PRESENT_CURRENT.address], j._cur))
+        # raw positions of all servos converted at once
+        deg = ticks2deg([j._pos for j in self.j + [self.hand]]).tolist()
+        pos = tuple(deg[:-1])
+        pos_hand = deg[-1]
+        vel = tuple(j._vel for j in self.j)
+        cur = tuple(j._cur for j in self.j)
+
+        if "motion" in names:
+            moving = False
+            err = 0
             for j in self.j:
-                tmp.append(j.tmp)
-        self._tmp = tmp
+                j._moving = reader.get(j.id, layout[j.MOVING.address],
+                                       j._moving)
+                j._err = reader.get(j.id,
+                                    layout[j.HARDWARE_ERROR_STATUS.address],
+                                    j._err)
+                moving |= j._moving
+                err |= j._err
+            moving = bool(moving)
+        else:
+            moving = prev.moving
+            err = prev.err
 
-        moving = False
-        with self._lock:
+        if "slow" in names:
             for j in self.j:
-                moving |= j.moving
-        if moving:
-            self._moving = True
+                j._tmp = reader.get(j.id,
+                                    layout[j.PRESENT_TEMPERATURE.address],
+                                    j._tmp)
+            tmp = tuple(j._tmp for j in self.j)
+            prof_vel = tuple(
+                reader.get(j.id, layout[j.PROFILE_VELOCITY.address])
+                for j in self.j)
+            torque_enable = tuple(
+                reader.get(j.id, layout[j.TORQUE_ENABLE.address])
+                for j in self.j)
         else:
-            self._moving = False
+            tmp = prev.tmp
+            prof_vel = prev.prof_vel
+            torque_enable = prev.torque_enable
+
+        return CraneX7State(prev.seq + 1 if prev else 0, stamp, cycle_time,
+                            pos, pos_hand, vel, cur, moving, err,
+                            tmp, prof_vel, torque_enable)
+
+    def _update_status_rate(self, now):
+        # exponential moving average of the achieved status cycle rate
+        if self._status_time is not None and now > self._status_time:
+            rate = 1.0 / (now - self._status_time)
+            if self._status_rate:
+                self._status_rate += self.STATUS_RATE_FILTER * \
+                    (rate - self._status_rate)
+            else:
+                self._status_rate = rate
+        self._status_time = now
 
-        err = 0
-        with self._lock:
-            for j in self.j:
-                err |= j.err
-        self._err = err
+    @property
+    def state(self):
+        # latest status snapshot (CraneX7State, None until the first cycle)
+        return self._state
 
-        prof_vel = list()
-        with self._lock:
-            for j in self.j:
-                prof_vel.append(j.prof_vel)
-        self._all_prof_vel = prof_vel
+    @property
+    def pos(self):
+        state = self._state
+        return state.pos if state else None
 
-        torque_enable = list()
-        with self._lock:
-            for j in self.j:
-                torque_enable.append(j.torque)
-        self._torque_enable = torque_enable
+    @property
+    def pos_rad(self):
+        # joint positions [rad] (numpy array)
+        state = self._state
+        return np.radians(state.pos) if state else None
 
-        loop.call_later(0.01, self._status_updater, loop)
+    @property
+    def pose(self):
+        # (3 x 4 pose [m], elbow [rad]) of the latest snapshot
+        state = self._state
+        if not state:
+            return None
+        cached = self._pose
+        if cached and cached[0] == state.seq:
+            return cached[1]
+        pose = self._kinematics.fk(np.radians(state.pos))
+        self._pose = (state.seq, pose)
+        return pose
 
     @property
-    def pos(self):
-        return self._pos
+    def kinematics(self):
+        return self._kinematics
+
+    @property
+    def max_speed_cartesian(self):
+        return self._max_speed_cartesian
+
+    @property
+    def min_accel_time_cartesian(self):
+        return self._min_accel_time_cartesian
+
+    @property
+    def workspace(self):
+        return self._workspace
+
+    @property
+    def ik_result(self):
+        # IKResult of the last solve (iterations, solve time, errors)
+        return self._ik_result
+
+    @property
+    def ik_time(self):
+        # solve time [s] of inverse kinematics
+        return self._ik_time
+
+    @property
+    def ik_iterations(self):
+        return self._ik_iterations
 
     @property
     def vel(self):
-        return self._vel
+        state = self._state
+        return state.vel if state else None
 
     @property
     def cur(self):
-        return self._cur
+        state = self._state
+        return state.cur if state else None
 
     @property
     def tmp(self):
-        return self._tmp
+        state = self._state
+        return state.tmp if state else None
 
     @property
     def moving(self):
-        return self._moving
+        state = self._state
+        return state.moving if state else None
 
     @property
     def err(self):
-        return self._err
+        state = self._state
+        return state.err if state else None
+
+    @property
+    def loop_stats(self):
+        # LoopStats (period, jitter and overrun) of the status loop
+        return self._loop_stats
+
+    def dump_trace(self, path=None):
+        # write the event trace to path (default: trace_path)
+        path = path or self._trace_path
+        if not path:
+            return False
+        try:
+            return self._trace.dump(path)
+        except (IOError, OSError) as e:
+            logging.error("cannot dump trace: " + str(e))
+            return False
+
+    @property
+    def trace(self):
+        # TraceRecorder of commands, bus transactions and status cycles
+        return self._trace
+
+    @property
+    def history(self):
+        # TelemetryHistory of every status sample
+        return self._history
+
+    @property
+    def status_rate(self):
+        # achieved status cycle rate [Hz]
+        return self._status_rate
+
+    @property
+    def command_latency(self):
+        # latency [s] from API call to bus write of commands
+        return self._command_latency
+
+    @property
+    def bus_rtt(self):
+        # round-trip time [s] of one transaction (before, after tuning)
+        return self._bus_rtt
+
+    @property
+    def loop(self):
+        # event loop of the bus thread
+        return self._loop
+
+    @property
+    def motion_queue_len(self):
+        # queued motions including the running one
+        return len(self._motions) + (1 if self._motion else 0)
+
+    @property
+    def motion_queue_size(self):
+        return self._motion_queue_size
+
+    @property
+    def motion_queue_full(self):
+        return self.motion_queue_len >= self._motion_queue_size
+
+    @property
+    def motion_throughput(self):
+        # completed queued motions per second (recent completions)
+        done = list(self._motion_done)
+        if len(done) < 2 or done[-1] <= done[0]:
+            return 0.0
+        return (len(done) - 1) / (done[-1] - done[0])
 
     @property
     def is_opened(self):
@@ -648,7 +2352,8 @@ class CraneX7(object):
 
     @property
     def all_prof_vel(self):
-        return self._all_prof_vel
+        state = self._state
+        return state.prof_vel if state else None
 
     @property
     def pause(self):
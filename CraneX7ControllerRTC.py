@@ -46,6 +46,26 @@ cranex7controllerrtc_spec = ["implementation_id", "CraneX7ControllerRTC",
                              "conf.default.device", "/dev/ttyUSB0",
                              "conf.__widget__.device", "text",
                              "conf.__type__.device", "string",
+                             "conf.default.control_rate", "100.0",
+                             "conf.__widget__.control_rate", "text",
+                             "conf.__type__.control_rate", "double",
+                             "conf.default.motion_status_rate", "20.0",
+                             "conf.__widget__.motion_status_rate", "text",
+                             "conf.__type__.motion_status_rate", "double",
+                             "conf.default.slow_status_rate", "1.0",
+                             "conf.__widget__.slow_status_rate", "text",
+                             "conf.__type__.slow_status_rate", "double",
+                             "conf.default.trace_file", "",
+                             "conf.__widget__.trace_file", "text",
+                             "conf.__type__.trace_file", "string",
+                             "conf.default.workspace_dir", "",
+                             "conf.__widget__.workspace_dir", "text",
+                             "conf.__type__.workspace_dir", "string",
+                             "conf.default.bus_profile", "default",
+                             "conf.__widget__.bus_profile", "radio",
+                             "conf.__constraints__.bus_profile",
+                             "(default,low_latency)",
+                             "conf.__type__.bus_profile", "string",
                              ""]
 # </rtc-template>
 
@@ -103,6 +123,40 @@ class CraneX7ControllerRTC(OpenRTM_aist.DataFlowComponentBase):
         - DefaultValue: /dev/ttyUSB0
         """
         self._device = ['/dev/ttyUSB0']
+        """
+        - Name:  control_rate
+        - DefaultValue: 100.0
+        - Unit: Hz
+        """
+        self._control_rate = [100.0]
+        """
+        - Name:  motion_status_rate
+        - DefaultValue: 20.0
+        - Unit: Hz
+        """
+        self._motion_status_rate = [20.0]
+        """
+        - Name:  slow_status_rate
+        - DefaultValue: 1.0
+        - Unit: Hz
+        """
+        self._slow_status_rate = [1.0]
+        """
+        - Name:  trace_file
+        - DefaultValue: ""
+        """
+        self._trace_file = ['']
+        """
+        - Name:  workspace_dir
+        - DefaultValue: ""
+        """
+        self._workspace_dir = ['']
+        """
+        - Name:  bus_profile
+        - DefaultValue: default
+        - Constraint: (default,low_latency)
+        """
+        self._bus_profile = ['default']
 
         # </rtc-template>
 
@@ -117,6 +171,13 @@ class CraneX7ControllerRTC(OpenRTM_aist.DataFlowComponentBase):
     def onInitialize(self):
         # Bind variables and configuration variable
         self.bindParameter("device", self._device, "/dev/ttyUSB0")
+        self.bindParameter("control_rate", self._control_rate, "100.0")
+        self.bindParameter("motion_status_rate",
+                           self._motion_status_rate, "20.0")
+        self.bindParameter("slow_status_rate", self._slow_status_rate, "1.0")
+        self.bindParameter("trace_file", self._trace_file, "")
+        self.bindParameter("workspace_dir", self._workspace_dir, "")
+        self.bindParameter("bus_profile", self._bus_profile, "default")
 
         # Set InPort buffers
         self.addInPort("joints", self._jointsIn)
@@ -198,7 +259,19 @@ class CraneX7ControllerRTC(OpenRTM_aist.DataFlowComponentBase):
     #
     #
     def onActivated(self, ec_id):
-        self._robot = robot(device=self._device[0])
+        profiles = {"default": None,
+                    "low_latency": robot.BUS_PROFILE_LOW_LATENCY}
+        if self._bus_profile[0] not in profiles:
+            self._log.RTC_ERROR("invalid bus_profile: " +
+                                self._bus_profile[0])
+            return RTC.RTC_ERROR
+        self._robot = robot(device=self._device[0],
+                            control_rate=self._control_rate[0],
+                            motion_status_rate=self._motion_status_rate[0],
+                            slow_status_rate=self._slow_status_rate[0],
+                            trace_path=self._trace_file[0] or None,
+                            workspace_path=self._workspace_dir[0] or None,
+                            bus_profile=profiles[self._bus_profile[0]])
         if not self._robot.open():
             self._log.RTC_ERROR("cannot open robot communication: " + self._device[0])
             self._robot = None
@@ -225,6 +298,9 @@ class CraneX7ControllerRTC(OpenRTM_aist.DataFlowComponentBase):
         if not self._robot:
             return RTC.RTC_OK
 
+        if self._trace_file[0]:
+            self._robot.dump_trace()
+
         if self._robot.is_opened:
             if not self._robot.close():
                 self._log.RTC_ERROR("cannot close robot communication")
@@ -261,8 +337,9 @@ class CraneX7ControllerRTC(OpenRTM_aist.DataFlowComponentBase):
         if self._jointsIn.isNew():
             joints = self._jointsIn.read().data
             if len(joints) == 7:
-                self._log.RTC_INFO("move; " + str(joints))
-                self._robot.movej(joints)
+                if not self._robot.queue_movej(joints):
+                    self._log.RTC_ERROR("cannot queue joints: motion queue "
+                                        "is full or paused")
             else:
                 self._log.RTC_ERROR("invalid joints parameters: " + str(joints))
 
@@ -278,27 +355,28 @@ class CraneX7ControllerRTC(OpenRTM_aist.DataFlowComponentBase):
             else:
                 self._log.RTC_ERROR("invalid gripper control: " + str(grip))
 
+        # outputs are taken from one consistent status snapshot
+        state = self._robot.state
+        if not state:
+            return RTC.RTC_OK
+
         # output moving information
-        is_moving = self._robot.moving
-        self._log.RTC_DEBUG("is_moving: " + str(is_moving))
+        is_moving = state.moving
         self._d_is_moving.data = is_moving
         self._is_movingOut.write()
 
         # output joints information
-        joints = self._robot.pos
-        self._log.RTC_DEBUG("out_joints: " + str(joints))
+        joints = state.pos
         self._d_out_joints.data = joints
         self._out_jointsOut.write()
 
         # output current information
-        current = self._robot.cur
-        self._log.RTC_DEBUG("out_current: " + str(current))
+        current = state.cur
         self._d_out_current.data = current
         self._out_currentOut.write()
 
         # output velocity information
-        velocity = self._robot.vel
-        self._log.RTC_DEBUG("out_velocity: " + str(velocity))
+        velocity = state.vel
         self._d_out_velocity.data = velocity
         self._out_velocityOut.write()
 
@@ -0,0 +1,533 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import time
+import numpy as np
+
+__author__ = "Saburo Takahashi"
+__copyright__ = "Copyright 2017, Saburo Takahashi"
+__license__ = "MIT License"
+
+
+def rotations(axis, angles):
+    # rotation matrices (N x 3 x 3) about the x, y or z axis
+    c = np.cos(angles)
+    s = np.sin(angles)
+    r = np.zeros((len(c), 3, 3))
+    i, j = {"x": (1, 2), "y": (2, 0), "z": (0, 1)}[axis]
+    k = 3 - i - j
+    r[:, k, k] = 1.0
+    r[:, i, i] = c
+    r[:, j, j] = c
+    r[:, i, j] = -s
+    r[:, j, i] = s
+    return r
+
+
+def orientation_error(rot, target):
+    # rotation vector (approximately) from rot to target (N x 3 x 3)
+    return 0.5 * np.sum(np.cross(rot.transpose(0, 2, 1),
+                                 target.transpose(0, 2, 1)), axis=1)
+
+
+def wrap(angle):
+    return (angle + np.pi) % (2.0 * np.pi) - np.pi
+
+
+def rotation_vector(rot):
+    # axis * angle of a rotation matrix
+    angle = np.arccos(np.clip((np.trace(rot) - 1.0) / 2.0, -1.0, 1.0))
+    axis = np.array([rot[2, 1] - rot[1, 2], rot[0, 2] - rot[2, 0],
+                     rot[1, 0] - rot[0, 1]])
+    if angle < 1e-9:
+        return 0.5 * axis
+    if np.pi - angle < 1e-6:
+        # half turn: rot + I = 2 axis axis^T
+        m = rot + rot.T + 2.0 * np.eye(3)
+        axis = m[:, int(np.argmax(np.diag(m)))]
+        return angle * axis / np.linalg.norm(axis)
+    return angle * axis / (2.0 * np.sin(angle))
+
+
+def rotation_matrix(vector):
+    # rotation matrix of axis * angle (Rodrigues)
+    angle = np.linalg.norm(vector)
+    if angle < 1e-12:
+        return np.eye(3)
+    k = np.array([[0.0, -vector[2], vector[1]],
+                  [vector[2], 0.0, -vector[0]],
+                  [-vector[1], vector[0], 0.0]]) / angle
+    return np.eye(3) + np.sin(angle) * k + \
+        (1.0 - np.cos(angle)) * k.dot(k)
+
+
+class TrapezoidProfile(object):
+    # Path parameter s (0 to 1) over time with constant acceleration for
+    # accel_time at both ends; cruise_time is the time the path takes at
+    # full speed (without acceleration)
+    def __init__(self, cruise_time, accel_time):
+        self.accel_time = accel_time
+        self.duration = max(cruise_time, accel_time) + accel_time
+        self._speed = 1.0 / (self.duration - accel_time) \
+            if self.duration > 0 else 0.0
+
+    def __call__(self, t):
+        ta = self.accel_time
+        if t <= 0.0:
+            return 0.0
+        if t >= self.duration:
+            return 1.0
+        if ta <= 0.0:
+            return t * self._speed
+        if t < ta:
+            return 0.5 * self._speed * t * t / ta
+        if t <= self.duration - ta:
+            return self._speed * (t - 0.5 * ta)
+        rest = self.duration - t
+        return 1.0 - 0.5 * self._speed * rest * rest / ta
+
+
+class LinearPath(object):
+    # Straight line of the control point; the orientation turns about one
+    # axis and the elbow changes linearly
+    def __init__(self, start, end, start_elbow=0.0, end_elbow=0.0):
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self._rotation = rotation_vector(
+            self.start[:, :3].T.dot(self.end[:, :3]))
+        self.start_elbow = start_elbow
+        self.end_elbow = start_elbow + wrap(end_elbow - start_elbow)
+        self.length = np.linalg.norm(self.end[:, 3] - self.start[:, 3])
+        self.angle = np.linalg.norm(self._rotation)
+
+    def __call__(self, s):
+        # (pose, elbow) at path parameter s
+        pose = np.empty((3, 4))
+        pose[:, 3] = self.position(s)
+        pose[:, :3] = self.start[:, :3].dot(
+            rotation_matrix(s * self._rotation))
+        return pose, self.start_elbow + s * (self.end_elbow - self.start_elbow)
+
+    def position(self, s):
+        return self.start[:, 3] + s * (self.end[:, 3] - self.start[:, 3])
+
+
+class CircularPath(LinearPath):
+    # Arc of the control point from start through the position of via to
+    # end at constant speed along the arc; orientation and elbow change as
+    # on a LinearPath (the orientation of via is not used)
+    def __init__(self, start, via, end, start_elbow=0.0, end_elbow=0.0):
+        super(CircularPath, self).__init__(start, end, start_elbow,
+                                           end_elbow)
+        p0 = self.start[:, 3]
+        a = np.asarray(via, dtype=np.float64)[:, 3] - p0
+        b = self.end[:, 3] - p0
+        n = np.cross(a, b)
+        nn = n.dot(n)
+        if nn <= 1e-12 * a.dot(a) * b.dot(b):
+            raise ValueError("circular path: points on a line")
+        # circumcenter and the arc angle measured from start about n
+        self.center = p0 + (a.dot(a) * np.cross(b, n) +
+                            b.dot(b) * np.cross(n, a)) / (2.0 * nn)
+        self.radius = np.linalg.norm(p0 - self.center)
+        self._u = (p0 - self.center) / self.radius
+        self._w = np.cross(n / np.sqrt(nn), self._u)
+        r = self.end[:, 3] - self.center
+        self.arc = np.arctan2(r.dot(self._w), r.dot(self._u)) % (2.0 * np.pi)
+        self.length = self.radius * self.arc
+
+    def position(self, s):
+        phi = s * self.arc
+        return self.center + self.radius * (np.cos(phi) * self._u +
+                                            np.sin(phi) * self._w)
+
+
+class IKResult(object):
+    # joint angles [rad] of an IK solve and its statistics (arrays over the
+    # targets of a batch solve)
+    def __init__(self, q, success, iterations, solve_time, pos_error,
+                 rot_error, elbow_error, manipulability):
+        self.q = q
+        self.success = success
+        self.iterations = iterations
+        self.solve_time = solve_time
+        self.pos_error = pos_error
+        self.rot_error = rot_error
+        self.elbow_error = elbow_error
+        self.manipulability = manipulability
+
+    def __getitem__(self, i):
+        # result of one target of a batch solve
+        return IKResult(self.q[i], self.success[i], self.iterations[i],
+                        self.solve_time, self.pos_error[i],
+                        self.rot_error[i], self.elbow_error[i],
+                        self.manipulability[i])
+
+
+def _ik_chunk(args):
+    # batch solve in a worker process
+    tool, targets, elbows, q0, lower, upper = args
+    return CraneX7Kinematics(tool).ik_batch(targets, elbows, q0, lower,
+                                            upper)
+
+
+class CraneX7Kinematics(object):
+    # Forward kinematics of CRANE-X7 (joint angles in radian, lengths in
+    # meter). Each joint is reached from the previous one by a translation
+    # along z (crane_x7_description, all angles zero: arm upright) and
+    # rotates about its own axis.
+    JOINTS = 7
+    LINK_OFFSETS = ((0.0, 0.0, 0.041),
+                    (0.0, 0.0, 0.064),
+                    (0.0, 0.0, 0.065),
+                    (0.0, 0.0, 0.185),
+                    (0.0, 0.0, 0.121),
+                    (0.0, 0.0, 0.129),
+                    (0.0, 0.0, 0.019))
+    JOINT_AXES = ("z", "y", "z", "y", "z", "y", "z")
+    # control point from the last joint (center of the gripper fingers)
+    TOOL_OFFSET = (0.0, 0.0, 0.090)
+
+    # joints which define the elbow swivel angle
+    SHOULDER = 1
+    ELBOW = 3
+    WRIST = 5
+
+    # inverse kinematics: convergence [m], [rad], damping and step limits
+    IK_MAX_ITERATIONS = 100
+    IK_POS_TOLERANCE = 1e-4
+    IK_ROT_TOLERANCE = 1e-3
+    IK_ELBOW_TOLERANCE = 1e-2
+    IK_ELBOW_STALL = 1e-5
+    IK_DAMPING = 1e-4
+    IK_MAX_STEP = 0.2
+    IK_DELTA = 1e-6
+
+    def __init__(self, tool=TOOL_OFFSET):
+        self._offsets = np.array(self.LINK_OFFSETS)
+        self._tool = np.array(tool, dtype=np.float64)
+
+    def fk(self, q):
+        # pose (3 x 4 homogeneous matrix without the last row) and elbow
+        # angle of one joint configuration
+        pose, elbow = self.fk_batch(np.asarray(q, dtype=np.float64)[None])
+        return pose[0], elbow[0]
+
+    def fk_batch(self, q):
+        # poses (N x 3 x 4) and elbow angles (N) of N x 7 configurations
+        rot, pos = self.frames(q)
+        pose = np.empty((len(pos[0]), 3, 4))
+        pose[:, :, :3] = rot[-1]
+        pose[:, :, 3] = self.tool(rot, pos)
+        return pose, self.elbow(rot, pos)
+
+    def frames(self, q):
+        # orientation (after the joint rotation) and origin of every joint:
+        # rot[k] (N x 3 x 3), pos[k] (N x 3)
+        q = np.atleast_2d(np.asarray(q, dtype=np.float64))
+        n = len(q)
+        r = np.tile(np.eye(3), (n, 1, 1))
+        p = np.zeros((n, 3))
+        rot = list()
+        pos = list()
+        for k in range(self.JOINTS):
+            p = p + np.einsum("nij,j->ni", r, self._offsets[k])
+            r = np.matmul(r, rotations(self.JOINT_AXES[k], q[:, k]))
+            rot.append(r)
+            pos.append(p)
+        return rot, pos
+
+    def tool(self, rot, pos):
+        # control point of the last frame
+        return pos[-1] + np.einsum("nij,j->ni", rot[-1], self._tool)
+
+    def elbow(self, rot, pos):
+        # axes of joint 1 (after its rotation) define the arm plane
+        return self.swivel(pos[self.SHOULDER], pos[self.ELBOW],
+                           pos[self.WRIST], rot[0][:, :, 0], rot[0][:, :, 1])
+
+    @staticmethod
+    def swivel(shoulder, elbow, wrist, heading, side):
+        # angle of the elbow around the shoulder-wrist line, measured from
+        # the vertical arm plane (heading and z, normal: side); 0 when the
+        # arm bends within that plane with a negative elbow joint angle.
+        # The reference is side x line, or heading when the line points
+        # along side
+        u = wrist - shoulder
+        u /= np.maximum(np.linalg.norm(u, axis=1), 1e-9)[:, None]
+        ref = np.cross(side, u)
+        aside = np.linalg.norm(ref, axis=1) < 1e-6
+        ua = u[aside]
+        ref[aside] = heading[aside] - \
+            np.sum(heading[aside] * ua, axis=1)[:, None] * ua
+        e = elbow - shoulder
+        e -= np.sum(e * u, axis=1)[:, None] * u
+        return np.arctan2(np.sum(np.cross(ref, e) * u, axis=1),
+                          np.sum(ref * e, axis=1))
+
+    def jacobian(self, q):
+        # pose, elbow and their Jacobians of one configuration
+        pose, elbow, jac, jac_elbow = self.jacobian_batch(
+            np.asarray(q, dtype=np.float64)[None])
+        return pose[0], elbow[0], jac[0], jac_elbow[0]
+
+    def jacobian_batch(self, q):
+        # poses (N x 3 x 4), elbows, Jacobians (N x 6 x 7) of the pose and
+        # (N x 7) of the elbow: the configurations and their 7
+        # perturbations each are evaluated in one batch
+        d = self.IK_DELTA
+        n = len(q)
+        m = self.JOINTS
+        poses, elbows = self.fk_batch(
+            (q[:, None, :] + d * np.vstack((np.zeros(m), np.eye(m))))
+            .reshape(-1, m))
+        poses = poses.reshape(n, m + 1, 3, 4)
+        elbows = elbows.reshape(n, m + 1)
+        pose = poses[:, 0]
+        jac = np.empty((n, 6, m))
+        jac[:, :3] = ((poses[:, 1:, :, 3] - pose[:, None, :, 3]) / d) \
+            .transpose(0, 2, 1)
+        jac[:, 3:] = (orientation_error(
+            np.repeat(pose[:, :, :3], m, axis=0),
+            poses[:, 1:, :, :3].reshape(-1, 3, 3)) / d) \
+            .reshape(n, m, 3).transpose(0, 2, 1)
+        jac_elbow = wrap(elbows[:, 1:] - elbows[:, :1]) / d
+        return pose, elbows[:, 0], jac, jac_elbow
+
+    def manipulability(self, q):
+        # sqrt(det(J J^T)) of N x 7 configurations (0: singular)
+        jac = self.jacobian_batch(np.atleast_2d(q))[2]
+        return self._manipulability(jac)
+
+    @staticmethod
+    def _manipulability(jac):
+        return np.sqrt(np.maximum(
+            np.linalg.det(np.matmul(jac, jac.transpose(0, 2, 1))), 0.0))
+
+    def ik(self, target, elbow=None, q0=None, lower=None, upper=None):
+        # solve of one target (see ik_batch)
+        result = self.ik_batch(
+            np.asarray(target, dtype=np.float64)[None],
+            None if elbow is None else [elbow], q0, lower, upper)
+        return result[0]
+
+    def ik_batch(self, targets, elbows=None, q0=None, lower=None,
+                 upper=None, processes=None, chunk_size=1000):
+        # Damped least squares on the pose and the elbow (swivel angle,
+        # None or NaN: free) as one 7 x 7 task, for N x 3 x 4 targets at
+        # once. Starts from q0 (7 or N x 7) and keeps the joints within
+        # [lower, upper]. A target succeeds when its pose converged and the
+        # elbow converged or stopped improving; after half of the
+        # iterations the elbow is released and the pose alone is solved
+        # (the remaining elbow error is reported in the result).
+        # processes: solve chunks of chunk_size targets in a process pool
+        targets = np.asarray(targets, dtype=np.float64)
+        n = len(targets)
+        if processes is not None and n > chunk_size:
+            return self._ik_pool(targets, elbows, q0, lower, upper,
+                                 processes, chunk_size)
+        start = time.time()
+        q = np.zeros((n, self.JOINTS))
+        if q0 is not None:
+            q[:] = q0
+        if lower is not None:
+            q = np.clip(q, lower, upper)
+        elbow = np.full(n, np.nan)
+        if elbows is not None:
+            elbow[:] = elbows
+        # elbow rows of free targets are zero, so they do not constrain
+        free = np.isnan(elbow)
+        last_elbow = np.full(n, np.inf)
+        iterations = np.zeros(n, dtype=np.int64)
+        success = np.zeros(n, dtype=bool)
+        pos_error = np.empty(n)
+        rot_error = np.empty(n)
+        elbow_error = np.zeros(n)
+        manipulability = np.empty(n)
+        damping = self.IK_DAMPING * np.eye(7)
+        # targets still being solved
+        i = np.arange(n)
+        for iteration in range(self.IK_MAX_ITERATIONS + 1):
+            pose, swivel, jac, jac_elbow = self.jacobian_batch(q[i])
+            err = np.zeros((len(i), 7))
+            err[:, :3] = targets[i, :, 3] - pose[:, :, 3]
+            err[:, 3:6] = orientation_error(pose[:, :, :3],
+                                            targets[i, :, :3])
+            fixed = ~np.isnan(elbow[i])
+            err[fixed, 6] = wrap(elbow[i][fixed] - swivel[fixed])
+            pos_error[i] = np.linalg.norm(err[:, :3], axis=1)
+            rot_error[i] = np.linalg.norm(err[:, 3:6], axis=1)
+            elbow_error[i] = np.abs(err[:, 6])
+            manipulability[i] = self._manipulability(jac)
+            done = ((pos_error[i] < self.IK_POS_TOLERANCE) &
+                    (rot_error[i] < self.IK_ROT_TOLERANCE) &
+                    (free[i] |
+                     (elbow_error[i] < self.IK_ELBOW_TOLERANCE) |
+                     (np.abs(elbow_error[i] - last_elbow[i]) <
+                      self.IK_ELBOW_STALL)))
+            success[i[done]] = True
+            if iteration == self.IK_MAX_ITERATIONS:
+                break
+            if iteration == self.IK_MAX_ITERATIONS // 2:
+                free[:] = True
+            keep = ~done
+            i = i[keep]
+            if not len(i):
+                break
+            iterations[i] += 1
+            last_elbow[i] = elbow_error[i]
+
+            jac_task = np.concatenate((jac[keep], jac_elbow[keep, None]),
+                                      axis=1)
+            jac_task[free[i], 6] = 0.0
+            err = err[keep]
+            err[free[i], 6] = 0.0
+            dq = np.einsum("nji,nj->ni", jac_task, np.linalg.solve(
+                np.matmul(jac_task, jac_task.transpose(0, 2, 1)) + damping,
+                err[:, :, None])[:, :, 0])
+            step = np.max(np.abs(dq), axis=1)
+            large = step > self.IK_MAX_STEP
+            dq[large] *= (self.IK_MAX_STEP / step[large])[:, None]
+            q[i] += dq
+            if lower is not None:
+                q[i] = np.clip(q[i], lower, upper)
+        return IKResult(q, success, iterations, time.time() - start,
+                        pos_error, rot_error, elbow_error, manipulability)
+
+    def _ik_pool(self, targets, elbows, q0, lower, upper, processes,
+                 chunk_size):
+        start = time.time()
+        n = len(targets)
+        chunks = list()
+        for k in range(0, n, chunk_size):
+            part = slice(k, k + chunk_size)
+            chunks.append((self._tool, targets[part],
+                           None if elbows is None else
+                           np.broadcast_to(elbows, n)[part],
+                           None if q0 is None else
+                           np.broadcast_to(q0, (n, self.JOINTS))[part],
+                           lower, upper))
+        pool = multiprocessing.Pool(processes or None)
+        try:
+            results = pool.map(_ik_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+        return IKResult(
+            np.concatenate([r.q for r in results]),
+            np.concatenate([r.success for r in results]),
+            np.concatenate([r.iterations for r in results]),
+            time.time() - start,
+            np.concatenate([r.pos_error for r in results]),
+            np.concatenate([r.rot_error for r in results]),
+            np.concatenate([r.elbow_error for r in results]),
+            np.concatenate([r.manipulability for r in results]))
+
+
+class WorkspaceIndex(object):
+    # Joint configurations sampled within the joint limits and grouped by
+    # the voxel of their control point: the samples of voxel v (C order
+    # over the grid) are starts[v]:starts[v + 1]. Saved as .npy files in a
+    # directory and memory-mapped when loaded, so that IK can start from a
+    # sample near the target
+    FILES = ("q", "features", "starts", "grid", "limits")
+    # pose features of a sample: position [voxel], orientation matrix and
+    # elbow (cos, sin), weighted so that the squared distance is
+    # |dp|^2 + ROT_WEIGHT |dR|^2 + ELBOW_WEIGHT |d(cos, sin)|^2 (the
+    # weights are those of the build)
+    ROT_WEIGHT = 1.0
+    ELBOW_WEIGHT = 0.5
+
+    def __init__(self, q, features, starts, grid, limits):
+        # arrays (also memory maps) as plain ndarrays for fast slicing
+        self.q = np.asarray(q)
+        self.features = np.asarray(features)
+        self.starts = np.asarray(starts)
+        # origin [m] (3), voxel size [m], shape (3)
+        self.grid = np.asarray(grid)
+        # lower and upper joint limits [rad] of the samples
+        self.limits = np.asarray(limits)
+        self._origin = np.array(grid[:3])
+        self._size = float(grid[3])
+        self._shape = np.array(grid[4:], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.q)
+
+    @classmethod
+    def build(cls, kinematics, lower, upper, samples=500000,
+              voxel_size=0.05, seed=0, batch=10000):
+        rs = np.random.RandomState(seed)
+        q = rs.uniform(lower, upper, (samples, kinematics.JOINTS))
+        pose = np.empty((samples, 3, 4))
+        elbow = np.empty(samples)
+        for k in range(0, samples, batch):
+            pose[k:k + batch], elbow[k:k + batch] = \
+                kinematics.fk_batch(q[k:k + batch])
+        pos = pose[:, :, 3]
+        origin = pos.min(axis=0)
+        shape = np.floor((pos.max(axis=0) - origin) / voxel_size) \
+            .astype(np.int64) + 1
+        cell = np.ravel_multi_index(
+            np.floor((pos - origin) / voxel_size).astype(np.int64).T, shape)
+        order = np.argsort(cell, kind="mergesort")
+        starts = np.searchsorted(cell[order], np.arange(np.prod(shape) + 1))
+        grid = np.concatenate((origin, [voxel_size], shape))
+        features = cls._features(pose[order], elbow[order], origin,
+                                 voxel_size)
+        return cls(q[order].astype(np.float32), features, starts, grid,
+                   np.array([lower, upper], dtype=np.float64))
+
+    @classmethod
+    def _features(cls, pose, elbow, origin, voxel_size):
+        features = np.empty((len(pose), 14), dtype=np.float32)
+        features[:, :3] = (pose[:, :, 3] - origin) / voxel_size
+        features[:, 3:12] = np.sqrt(cls.ROT_WEIGHT) * \
+            pose[:, :, :3].reshape(-1, 9)
+        features[:, 12] = np.sqrt(cls.ELBOW_WEIGHT) * np.cos(elbow)
+        features[:, 13] = np.sqrt(cls.ELBOW_WEIGHT) * np.sin(elbow)
+        return features
+
+    def save(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name in self.FILES:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path):
+        # IOError if a file is missing
+        return cls(*[np.load(os.path.join(path, name + ".npy"),
+                             mmap_mode="r") for name in cls.FILES])
+
+    def seed(self, pose, elbow=None):
+        # joint angles [rad] of the sample nearest to pose (and elbow) in
+        # the voxel of its position and the neighbouring voxels; None if
+        # there is no sample
+        pose = np.asarray(pose, dtype=np.float64)
+        f = self._features(pose[None], np.zeros(1) if elbow is None else
+                           np.array([elbow]), self._origin, self._size)[0]
+        cell = np.floor(f[:3]).astype(np.int64)
+        lo = np.maximum(cell - 1, 0)
+        hi = np.minimum(cell + 2, self._shape)
+        if np.any(lo >= hi):
+            return None
+        # the z neighbours of each x, y are contiguous
+        ny, nz = self._shape[1], self._shape[2]
+        ranges = [(self.starts[(x * ny + y) * nz + lo[2]],
+                   self.starts[(x * ny + y) * nz + hi[2]])
+                  for x in range(lo[0], hi[0]) for y in range(lo[1], hi[1])]
+        n = 14 if elbow is not None else 12
+        candidates = np.concatenate([self.features[a:b, :n]
+                                     for a, b in ranges])
+        if not len(candidates):
+            return None
+        d = candidates - f[:n]
+        k = int(np.argmin(np.einsum("ij,ij->i", d, d)))
+        # sample of the k-th candidate
+        for a, b in ranges:
+            if k < b - a:
+                return self.q[a + k].astype(np.float64)
+            k -= b - a
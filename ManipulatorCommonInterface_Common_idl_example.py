@@ -103,28 +103,36 @@ class ManipulatorCommonInterface_Common_i (JARA_ARM__POA.ManipulatorCommonInterf
 
     # RETURN_ID getState(out ULONG state)
     def getState(self):
-        if self._robot:
+        if self._robot and self._robot.state:
+            # one consistent snapshot of the robot status
+            snapshot = self._robot.state
             state = 0x01
             # check toruqe enable
-            for i in self._robot._torque_enable:
+            for i in snapshot.torque_enable:
                 if i is False:
                     state = 0x00
                     break
             # check moving
-            if self._robot._moving:
+            if snapshot.moving:
                 state |= 0x02
 
             # check alarm
-            if self._robot._err != 0:
+            if snapshot.err != 0:
                 state |= 0x04
 
-            # buffer is not available
+            # check motion queue (buffer is not available)
+            if self._robot.motion_queue_full:
+                state |= 0x08
 
             # check pause
             if self._robot.pause is True:
                 state |= 0x10
 
-            return DATATYPES_IDL.make_return_id('OK', ''), state
+            # motion queue occupancy and throughput
+            msg = 'motion queue: {0}/{1}, {2:.2f} motions/s'.format(
+                self._robot.motion_queue_len, self._robot.motion_queue_size,
+                self._robot.motion_throughput)
+            return DATATYPES_IDL.make_return_id('OK', msg), state
         else:
             return DATATYPES_IDL.make_return_id('NG', ''), 0
 
@@ -120,7 +120,7 @@ def make_return_id(ret_id, comment):
     elif ret_id == "NOT_SV_ON_ERR":
         ret = _0_JARA_ARM.NOT_SV_ON_ERR
     elif ret_id == "FULL_MOTION_QUEUE_ERR":
-        ret = _0_JARA_ARM.FULL_MOTIAON_QUEUE_ERR
+        ret = _0_JARA_ARM.FULL_MOTION_QUEUE_ERR
     elif ret_id == "NOT_IMPLEMENTED":
         ret = _0_JARA_ARM.NOT_IMPLEMENTED
     else:
@@ -71,15 +71,23 @@ class ManipulatorCommonInterface_Middle_i (JARA_ARM__POA.ManipulatorCommonInterf
 
     # RETURN_ID getFeedbackPosCartesian(out CarPosWithElbow pos)
     def getFeedbackPosCartesian(self):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result, pos
+        if self._robot and self._robot.pose:
+            pose, elbow = self._robot.pose
+            return DATATYPES_IDL.make_return_id('OK', ''),\
+                JARA_ARM.CarPosWithElbow(pose.tolist(), float(elbow), 0)
+        else:
+            return DATATYPES_IDL.make_return_id('NG', ''),\
+                JARA_ARM.CarPosWithElbow([[0.0] * 4] * 3, 0.0, 0)
 
     # RETURN_ID getMaxSpeedCartesian(out CartesianSpeed speed)
     def getMaxSpeedCartesian(self):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result, speed
+        if self._robot:
+            translation, rotation = self._robot.max_speed_cartesian
+            return DATATYPES_IDL.make_return_id('OK', ''),\
+                JARA_ARM.CartesianSpeed(translation, rotation)
+        else:
+            return DATATYPES_IDL.make_return_id('NG', ''),\
+                JARA_ARM.CartesianSpeed(0.0, 0.0)
 
     # RETURN_ID getMaxSpeedJoint(out DoubleSeq speed)
     def getMaxSpeedJoint(self):
@@ -93,9 +101,11 @@ class ManipulatorCommonInterface_Middle_i (JARA_ARM__POA.ManipulatorCommonInterf
 
     # RETURN_ID getMinAccelTimeCartesian(out double aclTime)
     def getMinAccelTimeCartesian(self):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result, aclTime
+        if self._robot:
+            return DATATYPES_IDL.make_return_id('OK', ''),\
+                self._robot.min_accel_time_cartesian
+        else:
+            return DATATYPES_IDL.make_return_id('NG', ''), 0.0
 
     # RETURN_ID getMinAccelTimeJoint(out double aclTime)
     def getMinAccelTimeJoint(self):
@@ -122,32 +132,69 @@ class ManipulatorCommonInterface_Middle_i (JARA_ARM__POA.ManipulatorCommonInterf
 
     # RETURN_ID moveLinearCartesianAbs(in CarPosWithElbow carPoint)
     def moveLinearCartesianAbs(self, carPoint):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result
+        if self._robot:
+            ret = self._robot.move_linear(carPoint.carPos, carPoint.elbow,
+                                          relative=False)
+            if ret is True:
+                return DATATYPES_IDL.make_return_id('OK', '')
+            else:
+                return DATATYPES_IDL.make_return_id('VALUE_ERR',
+                                                    'no IK solution')
+        else:
+            return DATATYPES_IDL.make_return_id('NG', '')
 
     # RETURN_ID moveLinearCartesianRel(in CarPosWithElbow carPoint)
     def moveLinearCartesianRel(self, carPoint):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result
+        if self._robot:
+            ret = self._robot.move_linear(carPoint.carPos, carPoint.elbow,
+                                          relative=True)
+            if ret is True:
+                return DATATYPES_IDL.make_return_id('OK', '')
+            else:
+                return DATATYPES_IDL.make_return_id('VALUE_ERR',
+                                                    'no IK solution')
+        else:
+            return DATATYPES_IDL.make_return_id('NG', '')
 
     # RETURN_ID movePTPCartesianAbs(in CarPosWithElbow carPoint)
     def movePTPCartesianAbs(self, carPoint):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result
+        if self._robot:
+            if self._robot.motion_queue_full:
+                return DATATYPES_IDL.make_return_id('FULL_MOTION_QUEUE_ERR',
+                                                    'motion queue is full')
+            ret = self._robot.move_pose(carPoint.carPos, carPoint.elbow,
+                                        relative=False, queue=True)
+            if ret is True:
+                return DATATYPES_IDL.make_return_id('OK', '')
+            else:
+                return DATATYPES_IDL.make_return_id('VALUE_ERR',
+                                                    'no IK solution')
+        else:
+            return DATATYPES_IDL.make_return_id('NG', '')
 
     # RETURN_ID movePTPCartesianRel(in CarPosWithElbow carPoint)
     def movePTPCartesianRel(self, carPoint):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result
+        if self._robot:
+            if self._robot.motion_queue_full:
+                return DATATYPES_IDL.make_return_id('FULL_MOTION_QUEUE_ERR',
+                                                    'motion queue is full')
+            ret = self._robot.move_pose(carPoint.carPos, carPoint.elbow,
+                                        relative=True, queue=True)
+            if ret is True:
+                return DATATYPES_IDL.make_return_id('OK', '')
+            else:
+                return DATATYPES_IDL.make_return_id('VALUE_ERR',
+                                                    'no IK solution')
+        else:
+            return DATATYPES_IDL.make_return_id('NG', '')
 
     # RETURN_ID movePTPJointAbs(in JointPos jointPoints)
     def movePTPJointAbs(self, jointPoints):
         if self._robot:
-            ret = self._robot.movej(jointPoints)
+            if self._robot.motion_queue_full:
+                return DATATYPES_IDL.make_return_id('FULL_MOTION_QUEUE_ERR',
+                                                    'motion queue is full')
+            ret = self._robot.queue_movej(jointPoints)
             if ret is True:
                 return DATATYPES_IDL.make_return_id('OK', '')
             else:
@@ -225,6 +272,7 @@ class ManipulatorCommonInterface_Middle_i (JARA_ARM__POA.ManipulatorCommonInterf
             return DATATYPES_IDL.make_return_id('NG', '')
 
         if self._robot:
+            self._robot.clear_motions()
             self._robot.pause = False
             self._middle_idl_state = self.MIDDLE_IDL_STATE_NORMAL
             return DATATYPES_IDL.make_return_id('OK', '')
@@ -257,9 +305,16 @@ class ManipulatorCommonInterface_Middle_i (JARA_ARM__POA.ManipulatorCommonInterf
 
     # RETURN_ID setMaxSpeedCartesian(in CartesianSpeed speed)
     def setMaxSpeedCartesian(self, speed):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result
+        if self._robot:
+            ret = self._robot.set_max_speed_cartesian(speed.translation,
+                                                      speed.rotation)
+            if ret is True:
+                return DATATYPES_IDL.make_return_id('OK', '')
+            else:
+                return DATATYPES_IDL.make_return_id('VALUE_ERR',
+                                                    'invalid value')
+        else:
+            return DATATYPES_IDL.make_return_id('NG', '')
 
     # RETURN_ID setMaxSpeedJoint(in DoubleSeq speed)
     def setMaxSpeedJoint(self, speed):
@@ -269,9 +324,15 @@ class ManipulatorCommonInterface_Middle_i (JARA_ARM__POA.ManipulatorCommonInterf
 
     # RETURN_ID setMinAccelTimeCartesian(in double aclTime)
     def setMinAccelTimeCartesian(self, aclTime):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result
+        if self._robot:
+            ret = self._robot.set_min_accel_time_cartesian(aclTime)
+            if ret is True:
+                return DATATYPES_IDL.make_return_id('OK', '')
+            else:
+                return DATATYPES_IDL.make_return_id('VALUE_ERR',
+                                                    'invalid value')
+        else:
+            return DATATYPES_IDL.make_return_id('NG', '')
 
     # RETURN_ID setMinAccelTimeJoint(in double aclTime)
     def setMinAccelTimeJoint(self, aclTime):
@@ -301,15 +362,29 @@ class ManipulatorCommonInterface_Middle_i (JARA_ARM__POA.ManipulatorCommonInterf
 
     # RETURN_ID moveCircularCartesianAbs(in CarPosWithElbow carPointR, in CarPosWithElbow carPointT)
     def moveCircularCartesianAbs(self, carPointR, carPointT):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result
+        if self._robot:
+            ret = self._robot.move_circular(carPointR.carPos, carPointT.carPos,
+                                            carPointT.elbow, relative=False)
+            if ret is True:
+                return DATATYPES_IDL.make_return_id('OK', '')
+            else:
+                return DATATYPES_IDL.make_return_id('VALUE_ERR',
+                                                    'no arc or IK solution')
+        else:
+            return DATATYPES_IDL.make_return_id('NG', '')
 
     # RETURN_ID moveCircularCartesianRel(in CarPosWithElbow carPointR, in CarPosWithElbow carPointT)
     def moveCircularCartesianRel(self, carPointR, carPointT):
-        raise CORBA.NO_IMPLEMENT(0, CORBA.COMPLETED_NO)
-        # *** Implement me
-        # Must return: result
+        if self._robot:
+            ret = self._robot.move_circular(carPointR.carPos, carPointT.carPos,
+                                            carPointT.elbow, relative=True)
+            if ret is True:
+                return DATATYPES_IDL.make_return_id('OK', '')
+            else:
+                return DATATYPES_IDL.make_return_id('VALUE_ERR',
+                                                    'no arc or IK solution')
+        else:
+            return DATATYPES_IDL.make_return_id('NG', '')
 
     # RETURN_ID setHome(in JointPos jointPoint)
     def setHome(self, jointPoint):
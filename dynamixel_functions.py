@@ -2,44 +2,92 @@
 # -*- coding: utf-8 -*-
 
 
+import os
 import sys
 from ctypes import cdll
 
-prefix = "./DynamixelSDK"
+# Backend of the Dynamixel functions
+#  - "python": pure Python Protocol 2.0 engine over pyserial (default)
+#  - "sdk":    prebuilt DynamixelSDK C library (path from DYNAMIXEL_SDK)
+backend = os.environ.get("DXL_BACKEND", "python")
 
-if sys.platform.startswith('win') or sys.platform.startswith('cygwin'):
-    if sys.maxsize > 2**32:
-        # for windows 64bit
-        dxl_lib = cdll.LoadLibrary(prefix + "/c/build/win64/output/dxl_x64_c.dll")
+prefix = os.environ.get("DYNAMIXEL_SDK", "./DynamixelSDK")
+
+
+def _load_sdk():
+    if sys.platform.startswith('win') or sys.platform.startswith('cygwin'):
+        if sys.maxsize > 2**32:
+            # for windows 64bit
+            return cdll.LoadLibrary(prefix + "/c/build/win64/output/dxl_x64_c.dll")
+        else:
+            # for windows 32bit
+            return cdll.LoadLibrary(prefix + "/c/build/win32/output/dxl_x86_c.dll")
+    elif sys.platform.startswith('darwin'):
+        # for Mac OS
+        return cdll.LoadLibrary(prefix + "/c/build/mac/libdxl_mac_c.dylib")
     else:
-        # for windows 32bit
-        dxl_lib = cdll.LoadLibrary(prefix + "/c/build/win32/output/dxl_x86_c.dll")
-elif sys.platform.startswith('darwin'):
-    # for Mac OS
-    dxl_lib = cdll.LoadLibrary(prefix + "/c/build/mac/libdxl_mac_c.dylib")
+        if sys.maxsize > 2**32:
+            # for linux 64bit
+            return cdll.LoadLibrary(prefix + "/c/build/linux64/libdxl_x64_c.so")
+        else:
+            # for linux 32bit
+            return cdll.LoadLibrary(prefix + "/c/build/linux32/libdxl_x86_c.so")
+
+
+if backend == "sdk":
+    dxl_lib = _load_sdk()
+
+    portHandler = dxl_lib.portHandler
+    openPort = dxl_lib.openPort
+    closePort = dxl_lib.closePort
+    setBaudRate = dxl_lib.setBaudRate
+
+    packetHandler = dxl_lib.packetHandler
+    printTxRxResult = dxl_lib.printTxRxResult
+    getTxRxResult = dxl_lib.getTxRxResult
+    getRxPacketError = dxl_lib.getRxPacketError
+    getLastTxRxResult = dxl_lib.getLastTxRxResult
+    getLastRxPacketError = dxl_lib.getLastRxPacketError
+
+    pingGetModelNum = dxl_lib.pingGetModelNum
+    reboot = dxl_lib.reboot
+
+    read1ByteTxRx = dxl_lib.read1ByteTxRx
+    read2ByteTxRx = dxl_lib.read2ByteTxRx
+    read4ByteTxRx = dxl_lib.read4ByteTxRx
+    write1ByteTxRx = dxl_lib.write1ByteTxRx
+    write2ByteTxRx = dxl_lib.write2ByteTxRx
+    write4ByteTxRx = dxl_lib.write4ByteTxRx
+    write1ByteTxOnly = dxl_lib.write1ByteTxOnly
+    write2ByteTxOnly = dxl_lib.write2ByteTxOnly
+    write4ByteTxOnly = dxl_lib.write4ByteTxOnly
+
+    groupSyncRead = dxl_lib.groupSyncRead
+    groupSyncReadClearParam = dxl_lib.groupSyncReadClearParam
+    groupSyncReadAddParam = dxl_lib.groupSyncReadAddParam
+    groupSyncReadRemoveParam = dxl_lib.groupSyncReadRemoveParam
+    groupSyncReadTxRxPacket = dxl_lib.groupSyncReadTxRxPacket
+    groupSyncReadIsAvailable = dxl_lib.groupSyncReadIsAvailable
+    groupSyncReadGetData = dxl_lib.groupSyncReadGetData
+
+    groupSyncWrite = dxl_lib.groupSyncWrite
+    groupSyncWriteAddParam = dxl_lib.groupSyncWriteAddParam
+    groupSyncWriteRemoveParam = dxl_lib.groupSyncWriteRemoveParam
+    groupSyncWriteChangeParam = dxl_lib.groupSyncWriteChangeParam
+    groupSyncWriteClearParam = dxl_lib.groupSyncWriteClearParam
+    groupSyncWriteTxPacket = dxl_lib.groupSyncWriteTxPacket
 else:
-    if sys.maxsize > 2**32:
-        # for linux 64bit
-        dxl_lib = cdll.LoadLibrary(prefix + "/c/build/linux64/libdxl_x64_c.so")
-    else:
-        # for linux 32bit
-        dxl_lib = cdll.LoadLibrary(prefix + "/c/build/linux32/libdxl_x86_c.so")
-
-
-portHandler = dxl_lib.portHandler
-openPort = dxl_lib.openPort
-closePort = dxl_lib.closePort
-setBaudRate = dxl_lib.setBaudRate
-
-packetHandler = dxl_lib.packetHandler
-printTxRxResult = dxl_lib.printTxRxResult
-getTxRxResult = dxl_lib.getTxRxResult
-getLastTxRxResult = dxl_lib.getLastTxRxResult
-getLastRxPacketError = dxl_lib.getLastRxPacketError
-
-read1ByteTxRx = dxl_lib.read1ByteTxRx
-read2ByteTxRx = dxl_lib.read2ByteTxRx
-read4ByteTxRx = dxl_lib.read4ByteTxRx
-write1ByteTxRx = dxl_lib.write1ByteTxRx
-write2ByteTxRx = dxl_lib.write2ByteTxRx
-write4ByteTxRx = dxl_lib.write4ByteTxRx
+    from dynamixel_protocol import (
+        portHandler, openPort, closePort, setBaudRate,
+        packetHandler, printTxRxResult, getTxRxResult, getRxPacketError,
+        getLastTxRxResult, getLastRxPacketError,
+        pingGetModelNum, reboot,
+        read1ByteTxRx, read2ByteTxRx, read4ByteTxRx,
+        write1ByteTxRx, write2ByteTxRx, write4ByteTxRx,
+        write1ByteTxOnly, write2ByteTxOnly, write4ByteTxOnly,
+        groupSyncRead, groupSyncReadClearParam, groupSyncReadAddParam,
+        groupSyncReadRemoveParam, groupSyncReadTxRxPacket,
+        groupSyncReadIsAvailable, groupSyncReadGetData,
+        groupSyncWrite, groupSyncWriteAddParam, groupSyncWriteRemoveParam,
+        groupSyncWriteChangeParam, groupSyncWriteClearParam,
+        groupSyncWriteTxPacket)
@@ -0,0 +1,649 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import struct
+
+__author__ = "Saburo Takahashi"
+__copyright__ = "Copyright 2017, Saburo Takahashi"
+__license__ = "MIT License"
+
+
+# Instructions
+PING = 0x01
+READ = 0x02
+WRITE = 0x03
+REBOOT = 0x08
+STATUS = 0x55
+SYNC_READ = 0x82
+SYNC_WRITE = 0x83
+BULK_READ = 0x92
+BULK_WRITE = 0x93
+
+BROADCAST_ID = 0xFE
+
+# Communication results (same values as DynamixelSDK)
+COMM_SUCCESS = 0
+COMM_PORT_BUSY = -1000
+COMM_TX_FAIL = -1001
+COMM_RX_FAIL = -1002
+COMM_TX_ERROR = -2000
+COMM_RX_WAITING = -3000
+COMM_RX_TIMEOUT = -3001
+COMM_RX_CORRUPT = -3002
+COMM_NOT_AVAILABLE = -9000
+
+COMM_RESULT = {
+    COMM_SUCCESS: "[TxRxResult] Communication success.",
+    COMM_PORT_BUSY: "[TxRxResult] Port is in use!",
+    COMM_TX_FAIL: "[TxRxResult] Failed transmit instruction packet!",
+    COMM_RX_FAIL: "[TxRxResult] Failed get status packet from device!",
+    COMM_TX_ERROR: "[TxRxResult] Incorrect instruction packet!",
+    COMM_RX_WAITING: "[TxRxResult] Now recieving status packet!",
+    COMM_RX_TIMEOUT: "[TxRxResult] There is no status packet!",
+    COMM_RX_CORRUPT: "[TxRxResult] Incorrect status packet!",
+    COMM_NOT_AVAILABLE:
+        "[TxRxResult] Protocol does not support This function!",
+}
+
+# Hardware error bits of status packet
+PACKET_ERROR = {
+    1: "[RxPacketError] Failed to process the instruction packet!",
+    2: "[RxPacketError] Undefined instruction or incorrect instruction!",
+    3: "[RxPacketError] CRC doesn't match!",
+    4: "[RxPacketError] The data value is out of range!",
+    5: "[RxPacketError] The data length does not match as expected!",
+    6: "[RxPacketError] The data value exceeds the limit value!",
+    7: "[RxPacketError] Writing or Reading is not available to target "
+       "address!",
+}
+ERRBIT_ALERT = 0x80
+
+# Packet layout: FF FF FD 00 ID LEN_L LEN_H INST PARAM... CRC_L CRC_H
+HEADER_LENGTH = 7
+PKT_ID = 4
+PKT_LENGTH_L = 5
+PKT_LENGTH_H = 6
+PKT_INSTRUCTION = 7
+PKT_ERROR = 8
+PKT_PARAMETER = 9
+
+MAX_PACKET_LENGTH = 4096
+
+
+def _make_crc_table():
+    # CRC-16 (polynomial 0x8005) used by Protocol 2.0
+    table = list()
+    for i in range(256):
+        crc = i << 8
+        for b in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x8005
+            else:
+                crc = crc << 1
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+
+CRC_TABLE = _make_crc_table()
+
+
+def crc16(data, length, crc=0):
+    table = CRC_TABLE
+    for i in range(length):
+        crc = ((crc << 8) ^ table[((crc >> 8) ^ data[i]) & 0xFF]) & 0xFFFF
+    return crc
+
+
+class Protocol2(object):
+    # Dynamixel Protocol 2.0 packet engine.
+    #
+    # port is a pyserial Serial or any file-like byte stream which has
+    # write() and read() (or readinto()). Timeouts are those of the stream:
+    # a read returning fewer bytes than requested is a timeout.
+    #
+    # Packets are built in and parsed from preallocated buffers; the data
+    # returned by read() is a memoryview which is valid until next call.
+
+    def __init__(self, port, max_packet_length=MAX_PACKET_LENGTH):
+        self.port = port
+        self._param = bytearray(max_packet_length)
+        self._tx = bytearray(2 * max_packet_length)
+        self._txv = memoryview(self._tx)
+        self._rx = bytearray(max_packet_length)
+        self._rxv = memoryview(self._rx)
+        self._readinto = getattr(port, "readinto", None)
+        self._reset_input = getattr(port, "reset_input_buffer", None)
+        self.last_result = COMM_SUCCESS
+        self.last_error = 0
+        self.last_id = None
+        # parameter span of the last status packet in the rx buffer
+        self._rx_start = PKT_PARAMETER
+        self._rx_end = PKT_PARAMETER
+
+    # -- packet transmission --------------------------------------------
+
+    def _send(self, mid, instruction, nparam):
+        # Frame _param[0:nparam] into the tx buffer with byte stuffing
+        src = self._param
+        tx = self._tx
+        tx[0] = 0xFF
+        tx[1] = 0xFF
+        tx[2] = 0xFD
+        tx[3] = 0x00
+        tx[PKT_ID] = mid
+        tx[PKT_INSTRUCTION] = instruction
+        n = PKT_INSTRUCTION + 1
+        b2 = b1 = instruction
+        for i in range(nparam):
+            c = src[i]
+            tx[n] = c
+            n += 1
+            if c == 0xFD and b1 == 0xFF and b2 == 0xFF:
+                tx[n] = 0xFD
+                n += 1
+            b2 = b1
+            b1 = c
+        length = n - HEADER_LENGTH + 2
+        tx[PKT_LENGTH_L] = length & 0xFF
+        tx[PKT_LENGTH_H] = length >> 8
+        crc = crc16(tx, n)
+        tx[n] = crc & 0xFF
+        tx[n + 1] = crc >> 8
+        n += 2
+
+        if self._reset_input:
+            self._reset_input()
+        try:
+            written = self.port.write(self._txv[:n])
+        except (IOError, OSError):
+            self.last_result = COMM_TX_FAIL
+            return False
+        if written is not None and written != n:
+            self.last_result = COMM_TX_FAIL
+            return False
+        self.last_result = COMM_SUCCESS
+        return True
+
+    # -- packet reception -----------------------------------------------
+
+    def _read_exact(self, offset, n):
+        got = 0
+        while got < n:
+            if self._readinto:
+                k = self._readinto(self._rxv[offset + got:offset + n])
+            else:
+                data = self.port.read(n - got)
+                k = len(data)
+                self._rx[offset + got:offset + got + k] = data
+            if not k:
+                return False
+            got += k
+        return True
+
+    def _receive(self):
+        # Receive one status packet; returns its id (None on failure)
+        rx = self._rx
+        if not self._read_exact(0, HEADER_LENGTH):
+            self.last_result = COMM_RX_TIMEOUT
+            return None
+        # find the header
+        while not (rx[0] == 0xFF and rx[1] == 0xFF and
+                   rx[2] == 0xFD and rx[3] == 0x00):
+            for i in range(HEADER_LENGTH - 1):
+                rx[i] = rx[i + 1]
+            if not self._read_exact(HEADER_LENGTH - 1, 1):
+                self.last_result = COMM_RX_TIMEOUT
+                return None
+
+        length = rx[PKT_LENGTH_L] | (rx[PKT_LENGTH_H] << 8)
+        n = HEADER_LENGTH + length
+        if length < 4 or n > len(rx):
+            self.last_result = COMM_RX_CORRUPT
+            return None
+        if not self._read_exact(HEADER_LENGTH, length):
+            self.last_result = COMM_RX_TIMEOUT
+            return None
+        if crc16(rx, n - 2) != (rx[n - 2] | (rx[n - 1] << 8)):
+            self.last_result = COMM_RX_CORRUPT
+            return None
+        if rx[PKT_INSTRUCTION] != STATUS:
+            self.last_result = COMM_RX_CORRUPT
+            return None
+
+        self._rx_start = PKT_PARAMETER
+        self._rx_end = self._unstuff(PKT_PARAMETER, n - 2)
+        self.last_error = rx[PKT_ERROR]
+        self.last_id = rx[PKT_ID]
+        self.last_result = COMM_SUCCESS
+        return self.last_id
+
+    def _unstuff(self, start, end):
+        # Remove stuffing bytes (FF FF FD FD -> FF FF FD) in place
+        rx = self._rx
+        w = start
+        i = start
+        while i < end:
+            c = rx[i]
+            rx[w] = c
+            w += 1
+            if c == 0xFD and w - start >= 3 and \
+               rx[w - 2] == 0xFF and rx[w - 3] == 0xFF:
+                i += 1
+            i += 1
+        return w
+
+    def _receive_from(self, mid, nparam):
+        # Receive the status packet of mid with nparam parameters
+        while True:
+            rid = self._receive()
+            if rid is None:
+                return False
+            if rid == mid:
+                break
+        if self._rx_end - self._rx_start != nparam:
+            self.last_result = COMM_RX_CORRUPT
+            return False
+        return True
+
+    def _txrx(self, mid, instruction, nparam, nresponse=0):
+        if not self._send(mid, instruction, nparam):
+            return False
+        if mid == BROADCAST_ID:
+            return True
+        return self._receive_from(mid, nresponse)
+
+    # -- instructions -----------------------------------------------------
+
+    def ping(self, mid):
+        # Returns (model number, firmware version) or None
+        if not self._txrx(mid, PING, 0, 3):
+            return None
+        return struct.unpack_from("<HB", self._rx, self._rx_start)
+
+    def reboot(self, mid):
+        return self._txrx(mid, REBOOT, 0)
+
+    def read(self, mid, address, length):
+        # Returns a memoryview of the data (valid until next call) or None
+        struct.pack_into("<HH", self._param, 0, address, length)
+        if not self._txrx(mid, READ, 4, length):
+            return None
+        return self._rxv[self._rx_start:self._rx_end]
+
+    def read1(self, mid, address):
+        data = self.read(mid, address, 1)
+        return data[0] if data is not None else 0
+
+    def read2(self, mid, address):
+        if self.read(mid, address, 2) is None:
+            return 0
+        return struct.unpack_from("<H", self._rx, self._rx_start)[0]
+
+    def read4(self, mid, address):
+        if self.read(mid, address, 4) is None:
+            return 0
+        return struct.unpack_from("<I", self._rx, self._rx_start)[0]
+
+    def write(self, mid, address, data, response=True):
+        # response=False sends the packet without waiting for status
+        # (needed when Status Return Level does not return write status)
+        n = len(data)
+        struct.pack_into("<H", self._param, 0, address)
+        self._param[2:2 + n] = data
+        if not response:
+            return self._send(mid, WRITE, 2 + n)
+        return self._txrx(mid, WRITE, 2 + n)
+
+    def _write_value(self, mid, address, fmt, value, response):
+        struct.pack_into(fmt, self._param, 0, address, value)
+        nparam = struct.calcsize(fmt)
+        if not response:
+            return self._send(mid, WRITE, nparam)
+        return self._txrx(mid, WRITE, nparam)
+
+    def write1(self, mid, address, value, response=True):
+        return self._write_value(mid, address, "<HB", value & 0xFF, response)
+
+    def write2(self, mid, address, value, response=True):
+        return self._write_value(mid, address, "<HH", value & 0xFFFF,
+                                 response)
+
+    def write4(self, mid, address, value, response=True):
+        return self._write_value(mid, address, "<HI", value & 0xFFFFFFFF,
+                                 response)
+
+    def sync_read(self, ids, address, length, out):
+        # Read the same block of every id into out (len(ids) * length bytes,
+        # in the order of ids)
+        param = self._param
+        struct.pack_into("<HH", param, 0, address, length)
+        n = 4
+        for mid in ids:
+            param[n] = mid
+            n += 1
+        if not self._send(BROADCAST_ID, SYNC_READ, n):
+            return False
+        offset = 0
+        for mid in ids:
+            if not self._receive_from(mid, length):
+                return False
+            out[offset:offset + length] = \
+                self._rxv[self._rx_start:self._rx_end]
+            offset += length
+        return True
+
+    def sync_write(self, ids, address, length, data):
+        # Write data (len(ids) * length bytes, in the order of ids)
+        param = self._param
+        struct.pack_into("<HH", param, 0, address, length)
+        n = 4
+        offset = 0
+        # copied through a view (no intermediate bytearray per servo)
+        data = memoryview(data)
+        for mid in ids:
+            param[n] = mid
+            param[n + 1:n + 1 + length] = data[offset:offset + length]
+            n += 1 + length
+            offset += length
+        return self._send(BROADCAST_ID, SYNC_WRITE, n)
+
+    def bulk_read(self, requests, out):
+        # requests: list of (id, address, length); the blocks are stored
+        # into out one after another in the order of requests
+        param = self._param
+        n = 0
+        for mid, address, length in requests:
+            struct.pack_into("<BHH", param, n, mid, address, length)
+            n += 5
+        if not self._send(BROADCAST_ID, BULK_READ, n):
+            return False
+        offset = 0
+        for mid, address, length in requests:
+            if not self._receive_from(mid, length):
+                return False
+            out[offset:offset + length] = \
+                self._rxv[self._rx_start:self._rx_end]
+            offset += length
+        return True
+
+    def bulk_write(self, requests):
+        # requests: list of (id, address, data)
+        param = self._param
+        n = 0
+        for mid, address, data in requests:
+            length = len(data)
+            struct.pack_into("<BHH", param, n, mid, address, length)
+            param[n + 5:n + 5 + length] = data
+            n += 5 + length
+        return self._send(BROADCAST_ID, BULK_WRITE, n)
+
+
+def tx_rx_result(result):
+    return COMM_RESULT.get(result, "[TxRxResult] Unknown error code!")
+
+
+def rx_packet_error(error):
+    if error & ERRBIT_ALERT:
+        return "[RxPacketError] Hardware error occurred. " \
+            "Check the error at Control Table (Hardware Error Status)!"
+    return PACKET_ERROR.get(error & 0x7F, "")
+
+
+# ---------------------------------------------------------------------------
+# DynamixelSDK compatible functions (see dynamixel_functions.py)
+# ---------------------------------------------------------------------------
+
+# serial read timeout [s]
+PORT_TIMEOUT = 0.05
+
+
+class PortHandler(object):
+    def __init__(self, device):
+        if isinstance(device, bytes):
+            device = device.decode("utf-8")
+        self.device = device
+        self.baudrate = 57600
+        self.serial = None
+        self.packet = None
+
+
+class GroupSyncRead(object):
+    def __init__(self, port, address, length):
+        self.port = port
+        self.address = address
+        self.length = length
+        self.ids = list()
+        self.index = dict()
+        self.data = bytearray()
+        self.available = False
+
+
+class GroupSyncWrite(object):
+    def __init__(self, port, address, length):
+        self.port = port
+        self.address = address
+        self.length = length
+        self.ids = list()
+        self.index = dict()
+        self.end = list()
+        self.data = bytearray()
+
+
+def _decode(data, offset, length):
+    # same value as the SDK C functions called through ctypes
+    # (4 byte values are returned as signed int)
+    if length == 1:
+        return data[offset]
+    elif length == 2:
+        return struct.unpack_from("<H", data, offset)[0]
+    else:
+        return struct.unpack_from("<i", data, offset)[0]
+
+
+def _encode(data, offset, value, length):
+    if length == 1:
+        data[offset] = value & 0xFF
+    elif length == 2:
+        struct.pack_into("<H", data, offset, value & 0xFFFF)
+    else:
+        struct.pack_into("<I", data, offset, value & 0xFFFFFFFF)
+
+
+def portHandler(device):
+    return PortHandler(device)
+
+
+def packetHandler():
+    pass
+
+
+def openPort(port):
+    import serial
+    try:
+        port.serial = serial.Serial(port.device, port.baudrate,
+                                    timeout=PORT_TIMEOUT)
+    except (serial.SerialException, OSError):
+        port.serial = None
+        return False
+    port.packet = Protocol2(port.serial)
+    return True
+
+
+def closePort(port):
+    if port.serial:
+        port.serial.close()
+    port.serial = None
+    port.packet = None
+
+
+def setBaudRate(port, baudrate):
+    port.baudrate = baudrate
+    if port.serial:
+        try:
+            port.serial.baudrate = baudrate
+        except (ValueError, IOError):
+            return False
+    return True
+
+
+def getTxRxResult(protocol_version, result):
+    return tx_rx_result(result)
+
+
+def getRxPacketError(protocol_version, error):
+    return rx_packet_error(error)
+
+
+def printTxRxResult(protocol_version, result):
+    print(tx_rx_result(result))
+
+
+def getLastTxRxResult(port, protocol_version):
+    return port.packet.last_result
+
+
+def getLastRxPacketError(port, protocol_version):
+    return port.packet.last_error
+
+
+def pingGetModelNum(port, protocol_version, mid):
+    ret = port.packet.ping(mid)
+    return ret[0] if ret else 0
+
+
+def reboot(port, protocol_version, mid):
+    port.packet.reboot(mid)
+
+
+def read1ByteTxRx(port, protocol_version, mid, address):
+    return port.packet.read1(mid, address)
+
+
+def read2ByteTxRx(port, protocol_version, mid, address):
+    return port.packet.read2(mid, address)
+
+
+def read4ByteTxRx(port, protocol_version, mid, address):
+    value = port.packet.read4(mid, address)
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def write1ByteTxRx(port, protocol_version, mid, address, value):
+    port.packet.write1(mid, address, value)
+
+
+def write2ByteTxRx(port, protocol_version, mid, address, value):
+    port.packet.write2(mid, address, value)
+
+
+def write4ByteTxRx(port, protocol_version, mid, address, value):
+    port.packet.write4(mid, address, value)
+
+
+def write1ByteTxOnly(port, protocol_version, mid, address, value):
+    port.packet.write1(mid, address, value, response=False)
+
+
+def write2ByteTxOnly(port, protocol_version, mid, address, value):
+    port.packet.write2(mid, address, value, response=False)
+
+
+def write4ByteTxOnly(port, protocol_version, mid, address, value):
+    port.packet.write4(mid, address, value, response=False)
+
+
+def groupSyncRead(port, protocol_version, address, length):
+    return GroupSyncRead(port, address, length)
+
+
+def groupSyncReadClearParam(group):
+    group.ids = list()
+    group.index = dict()
+    group.data = bytearray()
+    group.available = False
+
+
+def groupSyncReadAddParam(group, mid):
+    if mid in group.index:
+        return False
+    group.index[mid] = len(group.ids)
+    group.ids.append(mid)
+    group.data = bytearray(len(group.ids) * group.length)
+    group.available = False
+    return True
+
+
+def groupSyncReadRemoveParam(group, mid):
+    if mid not in group.index:
+        return
+    ids = [i for i in group.ids if i != mid]
+    groupSyncReadClearParam(group)
+    for i in ids:
+        groupSyncReadAddParam(group, i)
+
+
+def groupSyncReadTxRxPacket(group):
+    group.available = group.port.packet.sync_read(group.ids, group.address,
+                                                  group.length, group.data)
+
+
+def groupSyncReadIsAvailable(group, mid, address, length):
+    return group.available and mid in group.index and \
+        group.address <= address and \
+        address + length <= group.address + group.length
+
+
+def groupSyncReadGetData(group, mid, address, length):
+    if not groupSyncReadIsAvailable(group, mid, address, length):
+        return 0
+    offset = group.index[mid] * group.length + address - group.address
+    return _decode(group.data, offset, length)
+
+
+def groupSyncWrite(port, protocol_version, address, length):
+    return GroupSyncWrite(port, address, length)
+
+
+def groupSyncWriteClearParam(group):
+    group.ids = list()
+    group.index = dict()
+    group.end = list()
+    del group.data[:]
+
+
+def groupSyncWriteAddParam(group, mid, value, length):
+    # values added for the same id are appended one after another
+    if mid not in group.index:
+        group.index[mid] = len(group.ids)
+        group.ids.append(mid)
+        group.end.append(0)
+        group.data.extend(bytearray(group.length))
+    i = group.index[mid]
+    if group.end[i] + length > group.length:
+        return False
+    _encode(group.data, i * group.length + group.end[i], value, length)
+    group.end[i] += length
+    return True
+
+
+def groupSyncWriteChangeParam(group, mid, value, length, data_pos):
+    if mid not in group.index or data_pos + length > group.length:
+        return False
+    _encode(group.data, group.index[mid] * group.length + data_pos,
+            value, length)
+    return True
+
+
+def groupSyncWriteRemoveParam(group, mid):
+    if mid not in group.index:
+        return
+    i = group.index[mid]
+    del group.data[i * group.length:(i + 1) * group.length]
+    del group.ids[i]
+    del group.end[i]
+    group.index = dict((m, k) for k, m in enumerate(group.ids))
+
+
+def groupSyncWriteTxPacket(group):
+    group.port.packet.sync_write(group.ids, group.address, group.length,
+                                 group.data)
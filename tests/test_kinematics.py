@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+import shutil
+import sys
+import tempfile
+import numpy as np
+sys.path.append(".")
+sys.path.append("..")
+
+from CraneX7Kinematics import CraneX7Kinematics, CircularPath, \
+    LinearPath, TrapezoidProfile, WorkspaceIndex, rotation_matrix, \
+    rotation_vector
+
+
+__author__ = "Saburo Takahashi"
+__copyright__ = "Copyright 2017, Saburo Takahashi"
+__license__ = "MIT License"
+
+
+class TestKinematics(unittest.TestCase):
+    def setUp(self):
+        self._k = CraneX7Kinematics()
+
+    def test_upright(self):
+        pose, elbow = self._k.fk(np.zeros(7))
+        height = sum(o[2] for o in CraneX7Kinematics.LINK_OFFSETS) + \
+            CraneX7Kinematics.TOOL_OFFSET[2]
+        np.testing.assert_allclose(pose[:, :3], np.eye(3), atol=1e-12)
+        np.testing.assert_allclose(pose[:, 3], [0.0, 0.0, height],
+                                   atol=1e-12)
+        self.assertAlmostEqual(elbow, 0.0)
+
+    def test_base_rotation(self):
+        # joint 1 turns the bent arm about the vertical axis
+        q = np.radians([0.0, 45.0, 0.0, -90.0, 0.0, 0.0, 0.0])
+        pose0, elbow0 = self._k.fk(q)
+        q[0] = np.pi / 2
+        pose1, elbow1 = self._k.fk(q)
+        np.testing.assert_allclose(pose1[:2, 3],
+                                   [-pose0[1, 3], pose0[0, 3]], atol=1e-12)
+        self.assertAlmostEqual(pose1[2, 3], pose0[2, 3])
+        self.assertAlmostEqual(elbow1, elbow0)
+
+    def test_batch(self):
+        q = np.random.RandomState(0).uniform(-1.5, 1.5, (50, 7))
+        poses, elbows = self._k.fk_batch(q)
+        self.assertEqual(poses.shape, (50, 3, 4))
+        for i in range(len(q)):
+            pose, elbow = self._k.fk(q[i])
+            np.testing.assert_allclose(poses[i], pose, atol=1e-12)
+            self.assertAlmostEqual(elbows[i], elbow)
+        rot = poses[:, :, :3]
+        np.testing.assert_allclose(np.matmul(rot, rot.transpose(0, 2, 1)),
+                                   np.tile(np.eye(3), (50, 1, 1)), atol=1e-12)
+
+    def test_ik(self):
+        # targets near the start converge in a few iterations
+        rs = np.random.RandomState(1)
+        lower = np.radians([-157, -90, -157, -160, -157, -90, -167])
+        upper = np.radians([157, 90, 157, 0, 157, 90, 167])
+        for i in range(20):
+            q = rs.uniform(lower * 0.8, upper * 0.8)
+            pose, elbow = self._k.fk(q)
+            result = self._k.ik(pose, elbow, q + rs.normal(0, 0.05, 7),
+                                lower, upper)
+            self.assertTrue(result.success)
+            self.assertTrue(result.iterations <= 10)
+            solved, swivel = self._k.fk(result.q)
+            np.testing.assert_allclose(solved, pose, atol=1e-3)
+            self.assertAlmostEqual(swivel, elbow, places=2)
+            self.assertTrue(np.all(result.q >= lower))
+            self.assertTrue(np.all(result.q <= upper))
+
+    def test_ik_batch(self):
+        # one batch gives the results of single solves
+        rs = np.random.RandomState(2)
+        lower = np.radians([-157, -90, -157, -160, -157, -90, -167])
+        upper = np.radians([157, 90, 157, 0, 157, 90, 167])
+        q = rs.uniform(lower * 0.8, upper * 0.8, (30, 7))
+        poses, elbows = self._k.fk_batch(q)
+        elbows[::3] = np.nan
+        q0 = q + rs.normal(0, 0.05, q.shape)
+        result = self._k.ik_batch(poses, elbows, q0, lower, upper)
+        self.assertEqual(result.q.shape, (30, 7))
+        self.assertTrue(np.all(result.success))
+        for i in range(len(q)):
+            single = self._k.ik(poses[i], elbows[i], q0[i], lower, upper)
+            np.testing.assert_allclose(result.q[i], single.q, atol=1e-9)
+            self.assertEqual(result.iterations[i], single.iterations)
+        np.testing.assert_allclose(result.manipulability,
+                                   self._k.manipulability(result.q))
+
+    def test_manipulability(self):
+        # the upright arm is singular
+        self.assertAlmostEqual(self._k.manipulability(np.zeros(7))[0], 0.0)
+        q = np.radians([0.0, 30.0, 0.0, -90.0, 0.0, 30.0, 0.0])
+        self.assertTrue(self._k.manipulability(q)[0] > 1e-4)
+
+
+class TestPath(unittest.TestCase):
+    def test_rotation_vector(self):
+        for v in ([0.3, -0.2, 0.5], [0.0, 0.0, np.pi],
+                  [np.pi / np.sqrt(2), -np.pi / np.sqrt(2), 0.0]):
+            rot = rotation_matrix(np.array(v))
+            np.testing.assert_allclose(
+                rotation_matrix(rotation_vector(rot)), rot, atol=1e-9)
+
+    def test_profile(self):
+        # accelerates for accel_time, cruises and stops at the end
+        profile = TrapezoidProfile(1.0, 0.2)
+        self.assertAlmostEqual(profile.duration, 1.2)
+        self.assertEqual(profile(0.0), 0.0)
+        self.assertEqual(profile(profile.duration), 1.0)
+        self.assertAlmostEqual(profile(0.6), 0.5)
+        t = np.linspace(0.0, profile.duration, 121)
+        s = np.array([profile(x) for x in t])
+        self.assertTrue(np.all(np.diff(s) >= 0))
+        self.assertTrue(np.max(np.diff(s)) <= 1.0 / 100 + 1e-9)
+        # short paths never reach the speed
+        self.assertAlmostEqual(TrapezoidProfile(0.05, 0.2).duration, 0.4)
+
+    def test_linear_path(self):
+        start = np.hstack((np.eye(3), [[0.2], [0.0], [0.3]]))
+        end = np.hstack((rotation_matrix([0.0, 0.0, 0.8]),
+                         [[0.3], [0.1], [0.2]]))
+        path = LinearPath(start, end, 0.0, 0.4)
+        self.assertAlmostEqual(path.length, np.sqrt(0.03))
+        self.assertAlmostEqual(path.angle, 0.8)
+        np.testing.assert_allclose(path(0.0)[0], start, atol=1e-12)
+        np.testing.assert_allclose(path(1.0)[0], end, atol=1e-12)
+        pose, elbow = path(0.5)
+        np.testing.assert_allclose(pose[:, 3], [0.25, 0.05, 0.25])
+        np.testing.assert_allclose(pose[:, :3],
+                                   rotation_matrix([0.0, 0.0, 0.4]),
+                                   atol=1e-12)
+        self.assertAlmostEqual(elbow, 0.2)
+
+    def test_circular_path(self):
+        def at(p):
+            return np.hstack((np.eye(3), np.array(p)[:, None]))
+        path = CircularPath(at([0.3, 0.0, 0.2]), at([0.2, 0.1, 0.2]),
+                            at([0.1, 0.0, 0.2]))
+        np.testing.assert_allclose(path.center, [0.2, 0.0, 0.2], atol=1e-12)
+        self.assertAlmostEqual(path.radius, 0.1)
+        self.assertAlmostEqual(path.length, 0.1 * np.pi)
+        np.testing.assert_allclose(path(0.5)[0][:, 3], [0.2, 0.1, 0.2],
+                                   atol=1e-12)
+        np.testing.assert_allclose(path(1.0)[0][:, 3], [0.1, 0.0, 0.2],
+                                   atol=1e-12)
+        # the via point decides the direction (three quarters of a turn)
+        path = CircularPath(at([0.3, 0.0, 0.2]), at([0.2, -0.1, 0.2]),
+                            at([0.2, 0.1, 0.2]))
+        self.assertAlmostEqual(path.length, 0.15 * np.pi)
+        self.assertRaises(ValueError, CircularPath, at([0.1, 0.0, 0.0]),
+                          at([0.2, 0.0, 0.0]), at([0.3, 0.0, 0.0]))
+
+
+class TestWorkspace(unittest.TestCase):
+    lower = np.radians([-157, -90, -157, -160, -157, -90, -167])
+    upper = np.radians([157, 90, 157, 0, 157, 90, 167])
+
+    def setUp(self):
+        self._k = CraneX7Kinematics()
+        self._dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_save_load(self):
+        index = WorkspaceIndex.build(self._k, self.lower, self.upper,
+                                     samples=20000)
+        index.save(self._dir)
+        loaded = WorkspaceIndex.load(self._dir)
+        self.assertEqual(len(loaded), 20000)
+        self.assertTrue(isinstance(loaded.q.base, np.memmap))
+        np.testing.assert_array_equal(loaded.features, index.features)
+        np.testing.assert_allclose(loaded.limits, [self.lower, self.upper])
+        # samples are grouped by voxel
+        self.assertEqual(loaded.starts[-1], 20000)
+        self.assertTrue(np.all(np.diff(loaded.starts) >= 0))
+
+    def test_seed(self):
+        index = WorkspaceIndex.build(self._k, self.lower, self.upper,
+                                     samples=20000)
+        # the pose of a sample finds that sample
+        for i in (0, 5000, 19999):
+            pose, elbow = self._k.fk(index.q[i])
+            np.testing.assert_allclose(index.seed(pose, elbow), index.q[i])
+        pose = np.hstack((np.eye(3), [[2.0], [0.0], [0.0]]))
+        self.assertIsNone(index.seed(pose))
+        # a seed near the target converges fast
+        q = np.radians([40.0, 30.0, -20.0, -100.0, 30.0, 40.0, 10.0])
+        pose, elbow = self._k.fk(q)
+        result = self._k.ik(pose, elbow, index.seed(pose, elbow),
+                            self.lower, self.upper)
+        self.assertTrue(result.success)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+import struct
+import sys
+sys.path.append(".")
+sys.path.append("..")
+
+import dynamixel_protocol as dxp
+
+
+__author__ = "Saburo Takahashi"
+__copyright__ = "Copyright 2017, Saburo Takahashi"
+__license__ = "MIT License"
+
+
+class LoopbackStream(object):
+    # byte stream which records written packets and replays responses
+    def __init__(self):
+        self.tx = bytearray()
+        self.rx = bytearray()
+
+    def write(self, data):
+        self.tx += bytearray(data)
+        return len(data)
+
+    def read(self, n):
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+
+def status_packet(mid, params, error=0):
+    body = bytearray([mid, 0, 0, dxp.STATUS, error]) + bytearray(params)
+    struct.pack_into("<H", body, 1, len(body) - 3 + 2)
+    packet = bytearray(b"\xff\xff\xfd\x00") + body
+    crc = dxp.crc16(packet, len(packet))
+    return packet + bytearray(struct.pack("<H", crc))
+
+
+class TestProtocol(unittest.TestCase):
+    def setUp(self):
+        self._s = LoopbackStream()
+        self._p = dxp.Protocol2(self._s)
+
+    def test_crc(self):
+        # ping to ID 1 (from the Protocol 2.0 e-Manual)
+        packet = bytearray(b"\xff\xff\xfd\x00\x01\x03\x00\x01")
+        self.assertEqual(dxp.crc16(packet, len(packet)), 0x4E19)
+
+    def test_read_packet(self):
+        self._s.rx += status_packet(1, [0x00, 0x04, 0x00, 0x00])
+        self.assertEqual(self._p.read4(1, 132), 1024)
+        self.assertEqual(bytes(self._s.tx),
+                         b"\xff\xff\xfd\x00\x01\x07\x00\x02\x84\x00\x04\x00"
+                         b"\x1d\x15")
+
+    def test_ping(self):
+        self._s.rx += status_packet(1, [0x06, 0x04, 0x26])
+        self.assertEqual(self._p.ping(1), (1030, 38))
+
+    def test_stuffing(self):
+        self._p.write(1, 0x1234, bytearray(b"\xff\xff\xfd\x01"),
+                      response=False)
+        tx = self._s.tx
+        self.assertEqual(bytes(tx[8:15]), b"\x34\x12\xff\xff\xfd\xfd\x01")
+        self.assertEqual(tx[5] | tx[6] << 8, len(tx) - 7)
+
+        self._s.rx += status_packet(1, [0xff, 0xff, 0xfd, 0xfd])
+        self.assertEqual(bytes(self._p.read(1, 0, 3)), b"\xff\xff\xfd")
+
+    def test_timeout(self):
+        self.assertIsNone(self._p.read(1, 132, 4))
+        self.assertEqual(self._p.last_result, dxp.COMM_RX_TIMEOUT)
+
+    def test_corrupt(self):
+        packet = status_packet(1, [0x00, 0x04, 0x00, 0x00])
+        packet[-1] ^= 0xff
+        self._s.rx += packet
+        self.assertIsNone(self._p.read(1, 132, 4))
+        self.assertEqual(self._p.last_result, dxp.COMM_RX_CORRUPT)
+
+    def test_sync_read(self):
+        ids = [2, 3, 4]
+        for mid in ids:
+            self._s.rx += status_packet(mid, [mid, 0])
+        out = bytearray(2 * len(ids))
+        self.assertTrue(self._p.sync_read(ids, 126, 2, out))
+        self.assertEqual(bytes(out), b"\x02\x00\x03\x00\x04\x00")
+
+    def test_sync_write(self):
+        port = dxp.PortHandler("loopback")
+        port.packet = self._p
+        group = dxp.groupSyncWrite(port, 2, 112, 8)
+        for mid in [2, 3]:
+            dxp.groupSyncWriteAddParam(group, mid, 100, 4)
+            dxp.groupSyncWriteAddParam(group, mid, 2048 + mid, 4)
+        self.assertFalse(dxp.groupSyncWriteAddParam(group, 2, 0, 1))
+        dxp.groupSyncWriteTxPacket(group)
+        tx = self._s.tx
+        self.assertEqual(tx[4], dxp.BROADCAST_ID)
+        self.assertEqual(tx[7], dxp.SYNC_WRITE)
+        self.assertEqual(struct.unpack_from("<HHBIIBII", tx, 8),
+                         (112, 8, 2, 100, 2050, 3, 100, 2051))
+
+    def test_sync_write_in_place(self):
+        # values of the same ids are overwritten in the allocated buffer
+        port = dxp.PortHandler("loopback")
+        port.packet = self._p
+        group = dxp.groupSyncWrite(port, 2, 116, 4)
+        for mid in [2, 3]:
+            dxp.groupSyncWriteAddParam(group, mid, 0, 4)
+        data = group.data
+        for mid in [2, 3]:
+            self.assertTrue(dxp.groupSyncWriteChangeParam(group, mid,
+                                                          2000 + mid, 4, 0))
+        self.assertIs(group.data, data)
+        self.assertEqual(len(data), 8)
+        dxp.groupSyncWriteTxPacket(group)
+        self.assertEqual(struct.unpack_from("<HHBIBI", self._s.tx, 8),
+                         (116, 4, 2, 2002, 3, 2003))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
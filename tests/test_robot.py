@@ -2,12 +2,18 @@
 # -*- coding: utf-8 -*-
 
 import unittest
+import os
 import sys
+import tempfile
 import time
+import trollius as asyncio
+from trollius import From, Return
 sys.path.append(".")
 sys.path.append("..")
 
 from CraneX7Controller import CraneX7 as robot
+from CraneX7Controller import CraneX7State, TelemetryHistory, signed16
+from CraneX7Controller import BusQueue, TraceRecorder, sync_profile
 
 
 __author__ = "Saburo Takahashi"
@@ -74,6 +80,76 @@ class TestRobot(unittest.TestCase):
         self.assertIsNotNone(err)
         print("error: " + str(err))
 
+    def test_state(self):
+        state = self._r.state
+        self.assertIsNotNone(state)
+        self.assertTrue(len(state.pos) == 7)
+        self.assertTrue(self._r.state.seq >= state.seq)
+        print("state: seq=" + str(state.seq) + " stamp=" + str(state.stamp))
+
+    def test_status_rate(self):
+        rate = self._r.status_rate
+        self.assertTrue(rate > 0)
+        print("status rate: " + str(rate))
+
+    def test_loop_stats(self):
+        stats = self._r.loop_stats
+        self.assertTrue(stats.cycles > 0)
+        print("loop cycles: {0} overruns: {1} missed: {2} max jitter: {3}"
+              .format(stats.cycles, stats.overruns, stats.missed,
+                      stats.max_jitter))
+
+    def test_async_movej(self):
+        @asyncio.coroutine
+        def pickplace():
+            # gripper and arm move at once
+            moves = [self._r.movej_async(self.up_pos),
+                     self._r.gripper(100)]
+            results = yield From(asyncio.gather(*moves))
+            raise Return(results)
+
+        ret = self._r.run_coroutine(pickplace()).result(10.0)
+        self.assertEqual(ret, [True, True])
+        ret = self._r.run_coroutine(self._r.home_async()).result(15.0)
+        self.assertTrue(ret)
+
+    def test_trajectory(self):
+        waypoints = [(1.0, self.up_pos), (2.0, self.right_pos),
+                     (3.0, self.left_pos), (4.5, self.down_pos)]
+        for method in ("cubic", "quintic"):
+            ret = self._r.move_trajectory(waypoints, method=method,
+                                          sync=True)
+            self.assertTrue(ret)
+
+    def test_move_linear(self):
+        ret = self._r.movej(self.up_pos, sync=True)
+        self.assertTrue(ret)
+        start, elbow = self._r.pose
+        offset = [[1.0, 0.0, 0.0, 0.05],
+                  [0.0, 1.0, 0.0, 0.0],
+                  [0.0, 0.0, 1.0, -0.05]]
+        ret = self._r.move_linear(offset, relative=True, sync=True)
+        self.assertTrue(ret)
+        pose, elbow = self._r.pose
+        self.assertAlmostEqual(pose[0, 3], start[0, 3] + 0.05, places=2)
+        self.assertAlmostEqual(pose[2, 3], start[2, 3] - 0.05, places=2)
+
+    def test_move_circular(self):
+        ret = self._r.movej(self.up_pos, sync=True)
+        self.assertTrue(ret)
+        start, elbow = self._r.pose
+        via = [[1.0, 0.0, 0.0, 0.03],
+               [0.0, 1.0, 0.0, 0.03],
+               [0.0, 0.0, 1.0, 0.0]]
+        end = [[1.0, 0.0, 0.0, 0.06],
+               [0.0, 1.0, 0.0, 0.0],
+               [0.0, 0.0, 1.0, 0.0]]
+        ret = self._r.move_circular(via, end, relative=True, sync=True)
+        self.assertTrue(ret)
+        pose, elbow = self._r.pose
+        self.assertAlmostEqual(pose[0, 3], start[0, 3] + 0.06, places=2)
+        self.assertAlmostEqual(pose[1, 3], start[1, 3], places=2)
+
     def test_pickplace(self):
         ret = self._r.movej(self.up_pos, sync=True)
         self.assertTrue(ret)
@@ -115,6 +191,166 @@ class TestRobot(unittest.TestCase):
         self.assertTrue(ret)
 
 
+class TestTelemetry(unittest.TestCase):
+    # no robot required
+    def test_negative_current(self):
+        self.assertEqual(signed16(0xFFFF), -1)
+        self.assertEqual(signed16(0x8000), -32768)
+        self.assertEqual(signed16(0x7FFF), 32767)
+        self.assertEqual(signed16(-5), -5)
+
+        history = TelemetryHistory(8)
+        for i, raw in enumerate([0xFFFF, 0x0003]):
+            cur = tuple([signed16(raw)] * 7)
+            history.append(CraneX7State(i, 0.01 * i, 0.0, (0.0,) * 7, 0.0,
+                                        (0,) * 7, cur, False, 0,
+                                        (0,) * 7, (0,) * 7, (1,) * 7))
+        self.assertAlmostEqual(history.mean()[0], 1.0)
+        self.assertAlmostEqual(history.max()[0], 3.0)
+        self.assertAlmostEqual(history.rms()[0], (5.0) ** 0.5)
+
+
+class TestBusQueue(unittest.TestCase):
+    # no robot required
+    def run_queue(self, queue):
+        # drain the queue like the bus thread
+        while True:
+            item = queue.pop()
+            if item is None:
+                return
+            priority, submitted, work, args = item
+            work(*args)
+
+    def test_priority(self):
+        queue = BusQueue()
+        order = list()
+        queue.push(BusQueue.STATUS, 0.0, order.append, ("status",))
+        queue.push(BusQueue.COMMAND, 1.0, order.append, ("command",))
+        self.assertEqual(len(queue), 2)
+        self.run_queue(queue)
+        self.assertEqual(order, ["command", "status"])
+        self.assertEqual(len(queue), 0)
+        self.assertIsNone(queue.pop())
+
+    def test_fifo(self):
+        queue = BusQueue()
+        order = list()
+        for i in range(5):
+            queue.push(BusQueue.COMMAND, float(i), order.append, (i,))
+        for i in range(5, 8):
+            queue.push(BusQueue.STATUS, float(i), order.append, (i,))
+        self.run_queue(queue)
+        self.assertEqual(order, list(range(8)))
+
+    def test_preempt_sweep(self):
+        # a command submitted while the first read of a sweep is on the
+        # bus goes ahead of the remaining reads
+        queue = BusQueue()
+        order = list()
+
+        def read(i):
+            order.append("read" + str(i))
+            if i == 0:
+                queue.push(BusQueue.COMMAND, 0.0, order.append, ("command",))
+
+        for i in range(3):
+            queue.push(BusQueue.STATUS, 0.0, read, (i,))
+        self.run_queue(queue)
+        self.assertEqual(order, ["read0", "command", "read1", "read2"])
+
+
+class TestProfile(unittest.TestCase):
+    # no robot required
+    vlimit = [480] * 4
+
+    def arrival(self, travel, acc, vel):
+        # total time [ms] of velocity-based profiles
+        return [64.0 * abs(t) / v + (64.0 * v / a if a else 0.0)
+                for t, a, v in zip(travel, acc, vel) if t]
+
+    def test_same_arrival(self):
+        travel = [2000, -1000, 500, 1500]
+        acc, vel = sync_profile(travel, [40] * 4, [200] * 4, self.vlimit)
+        self.assertEqual(vel[0], 200)
+        self.assertEqual(acc[0], 40)
+        times = self.arrival(travel, acc, vel)
+        for t in times:
+            self.assertAlmostEqual(t / times[0], 1.0, delta=0.01)
+
+    def test_minimum(self):
+        acc, vel = sync_profile([4000, 1, 0], [10] * 3, [100] * 3,
+                                self.vlimit[:3])
+        self.assertEqual(acc, [10, 1, 1])
+        self.assertEqual(vel, [100, 1, 1])
+
+    def test_unlimited(self):
+        # unlimited velocity runs at the velocity limit
+        travel = [2000, 1000]
+        acc, vel = sync_profile(travel, [40, 40], [0, 0], self.vlimit[:2])
+        self.assertEqual(vel, [480, 240])
+        self.assertEqual(acc, [40, 20])
+        # unlimited acceleration stays unlimited
+        acc, vel = sync_profile(travel, [0, 0], [200, 200], self.vlimit[:2])
+        self.assertEqual(acc, [0, 0])
+        self.assertEqual(vel, [200, 100])
+        times = self.arrival(travel, acc, vel)
+        self.assertAlmostEqual(times[0], times[1])
+
+
+class TestTrace(unittest.TestCase):
+    # no robot required
+    def test_record(self):
+        trace = TraceRecorder(4)
+        self.assertEqual(len(trace), 0)
+        self.assertEqual(trace.events(), [])
+        trace.record(0.5, TraceRecorder.BUS_WRITE, 7, 116, 0.25, 1)
+        self.assertEqual(len(trace), 1)
+        self.assertEqual(trace.events(),
+                         [(0.5, TraceRecorder.BUS_WRITE, 7, 116, 0.25, 1)])
+        self.assertEqual(trace.code("movej"), 0)
+        self.assertEqual(trace.code("stop"), 1)
+        self.assertEqual(trace.code("movej"), 0)
+        self.assertEqual(trace.names, ["movej", "stop"])
+
+    def test_wraparound(self):
+        trace = TraceRecorder(4)
+        for i in range(10):
+            trace.record(float(i), TraceRecorder.CYCLE, value=i)
+        self.assertEqual(len(trace), 4)
+        self.assertEqual([e[5] for e in trace.events()], [6, 7, 8, 9])
+        self.assertEqual([e[0] for e in trace.events()],
+                         [6.0, 7.0, 8.0, 9.0])
+
+    def test_dump(self):
+        trace = TraceRecorder(3)
+        trace.code("movej")
+        for i in range(5):
+            trace.record(float(i), TraceRecorder.COMMAND, 0, 0, 0.0, i)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.assertTrue(trace.dump(path))
+            with open(path, "rb") as f:
+                data = f.read()
+        finally:
+            os.remove(path)
+
+        magic, version, size, names, count = \
+            TraceRecorder.HEADER.unpack_from(data)
+        self.assertEqual(magic, TraceRecorder.MAGIC)
+        self.assertEqual(version, TraceRecorder.VERSION)
+        self.assertEqual(size, TraceRecorder.RECORD.size)
+        self.assertEqual(count, 3)
+        offset = TraceRecorder.HEADER.size
+        self.assertEqual(data[offset:offset + names], b"movej")
+        offset += names
+        self.assertEqual(len(data), offset + count * size)
+        records = [TraceRecorder.RECORD.unpack_from(data, offset + i * size)
+                   for i in range(count)]
+        self.assertEqual(records, trace.events())
+        self.assertEqual([r[5] for r in records], [2, 3, 4])
+
+
 def test():
     unittest.main(verbosity=2)
 